@@ -0,0 +1,76 @@
+"""Summaries of benchmark samples and comparison against a stored baseline"""
+
+import math
+from typing import Dict, List
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of ``samples``"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(
+    latencies: List[float], elapsed: float, queries: int, errors: int
+) -> Dict:
+    requests = len(latencies)
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "mean": round(sum(latencies) / requests * 1000, 3) if requests else 0.0,
+            "max": round(max(latencies, default=0) * 1000, 3),
+        },
+        "queries_per_request": round(queries / requests, 3) if requests else 0.0,
+    }
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """List regressions of ``current`` against ``baseline``.
+
+    Failed requests always count. Latency and throughput may drift by
+    ``tolerance`` (a fraction) before they count; query counts are
+    deterministic (bench.run turns off single-flight coalescing), so any
+    increase is a regression.
+    """
+    regressions = []
+    for flow, result in current["flows"].items():
+        if result["errors"]:
+            regressions.append(f"{flow}: {result['errors']} failed requests")
+        base = baseline.get("flows", {}).get(flow)
+        if base is None:
+            continue
+        for pct in ("p95", "p99"):
+            before, after = base["latency_ms"][pct], result["latency_ms"][pct]
+            if after > before * (1 + tolerance):
+                regressions.append(f"{flow}: {pct} latency {before}ms -> {after}ms")
+        before, after = base["throughput_rps"], result["throughput_rps"]
+        if after < before * (1 - tolerance):
+            regressions.append(f"{flow}: throughput {before} -> {after} req/s")
+        before, after = base["queries_per_request"], result["queries_per_request"]
+        if after > before + 0.001:
+            regressions.append(f"{flow}: queries per request {before} -> {after}")
+    return regressions
+
+
+def format_table(results: Dict) -> str:
+    header = (
+        f"{'flow':<14}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+        f"{'p99 ms':>10}{'queries':>9}{'errors':>8}"
+    )
+    lines = [header, "-" * len(header)]
+    for flow, result in results["flows"].items():
+        latency = result["latency_ms"]
+        lines.append(
+            f"{flow:<14}{result['throughput_rps']:>10}{latency['p50']:>10}"
+            f"{latency['p95']:>10}{latency['p99']:>10}"
+            f"{result['queries_per_request']:>9}{result['errors']:>8}"
+        )
+    return "\n".join(lines)
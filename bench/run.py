@@ -0,0 +1,284 @@
+"""In-process benchmarks for the API hot paths.
+
+Drives ``src.app`` through httpx's ASGI transport against a fresh SQLite
+stand-in, so results depend only on the app and the machine. Run from the
+repository root:
+
+    python -m bench.run --output bench_output.json
+    python -m bench.run --baseline bench_output.json
+
+Requires ``httpx`` and ``aiosqlite``. Exits with status 1 when a flow fails
+requests or regresses against the baseline.
+"""
+
+import argparse
+import asyncio
+from dataclasses import dataclass
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+
+FLOWS = (
+    "login",
+    "profile",
+    "book_list",
+    "book_detail",
+    "book_create",
+    "book_update",
+    "user_create",
+)
+# Flows dominated by bcrypt run fewer requests to keep the suite short
+HASH_FLOWS = ("login", "user_create")
+
+PASSWORD = "bench-password"
+
+
+@dataclass
+class Context:
+    client: object
+    headers: Dict[str, str]
+    book_uids: List[str]
+    counter: itertools.count
+
+
+Request = Callable[[Context, int], Awaitable[object]]
+
+
+def _book(i: int) -> dict:
+    return {
+        "title": f"Benchmark book {i}",
+        "author": f"Author {i % 50}",
+        "year": 1950 + i % 70,
+        "description": f"Description of benchmark book number {i}",
+    }
+
+
+async def _login(ctx: Context, i: int):
+    return await ctx.client.post(
+        "/v1/auth/login", json={"username": "bench", "password": PASSWORD}
+    )
+
+
+async def _profile(ctx: Context, i: int):
+    return await ctx.client.get("/v1/auth/profile", headers=ctx.headers)
+
+
+async def _book_list(ctx: Context, i: int):
+    return await ctx.client.get("/v1/books", params={"limit": 20})
+
+
+async def _book_detail(ctx: Context, i: int):
+    uid = ctx.book_uids[i % len(ctx.book_uids)]
+    return await ctx.client.get(f"/v1/books/{uid}")
+
+
+async def _book_create(ctx: Context, i: int):
+    return await ctx.client.post("/v1/books", json=_book(next(ctx.counter)))
+
+
+async def _book_update(ctx: Context, i: int):
+    uid = ctx.book_uids[i % len(ctx.book_uids)]
+    return await ctx.client.patch(f"/v1/books/{uid}", json=_book(i))
+
+
+async def _user_create(ctx: Context, i: int):
+    n = next(ctx.counter)
+    return await ctx.client.post(
+        "/v1/users/",
+        json={
+            "username": f"bench{n}",
+            "email": f"bench{n}@example.com",
+            "password": PASSWORD,
+        },
+    )
+
+
+REQUESTS: Dict[str, Request] = {
+    "login": _login,
+    "profile": _profile,
+    "book_list": _book_list,
+    "book_detail": _book_detail,
+    "book_create": _book_create,
+    "book_update": _book_update,
+    "user_create": _user_create,
+}
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+async def _seed(client, books: int) -> Context:
+    response = await client.post(
+        "/v1/users/",
+        json={"username": "bench", "email": "bench@example.com", "password": PASSWORD},
+    )
+    response.raise_for_status()
+    response = await _login(Context(client, {}, [], itertools.count()), 0)
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    book_uids = []
+    for i in range(books):
+        response = await client.post("/v1/books", json=_book(i))
+        response.raise_for_status()
+        book_uids.append(response.json()["uid"])
+    return Context(client, headers, book_uids, itertools.count(1_000_000))
+
+
+async def _run_flow(
+    ctx: Context,
+    request: Request,
+    requests: int,
+    warmup: int,
+    concurrency: int,
+    queries: QueryCounter,
+) -> dict:
+    from bench.report import summarize
+
+    for i in range(warmup):
+        await request(ctx, i)
+
+    latencies: List[float] = []
+    errors = 0
+    pending = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in pending:
+            start = time.perf_counter()
+            response = await request(ctx, i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    queries_before = queries.count
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return summarize(latencies, elapsed, queries.count - queries_before, errors)
+
+
+async def run(args) -> dict:
+    import httpx
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    from src import app
+
+    queries = QueryCounter()
+    event.listen(Engine, "before_cursor_execute", queries)
+
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "requests": args.requests,
+            "hash_requests": args.hash_requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "books": args.books,
+            "accept_encoding": args.accept_encoding,
+        },
+        "flows": {},
+    }
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://bench",
+            headers={"Accept-Encoding": args.accept_encoding},
+        ) as client:
+            ctx = await _seed(client, args.books)
+            for flow in args.flows:
+                requests = args.hash_requests if flow in HASH_FLOWS else args.requests
+                warmup = min(args.warmup, requests)
+                results["flows"][flow] = await _run_flow(
+                    ctx, REQUESTS[flow], requests, warmup, args.concurrency, queries
+                )
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument(
+        "--hash-requests",
+        type=int,
+        default=40,
+        help="requests for the bcrypt-bound flows: " + ", ".join(HASH_FLOWS),
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--books", type=int, default=200, help="books seeded")
+    parser.add_argument(
+        "--flows",
+        type=lambda value: value.split(","),
+        default=list(FLOWS),
+        help="comma-separated subset of: " + ", ".join(FLOWS),
+    )
+    # In process there is no network to save, so compression is pure cost
+    parser.add_argument(
+        "--accept-encoding",
+        default="identity",
+        help="Accept-Encoding sent with every request, e.g. gzip or zstd",
+    )
+    parser.add_argument("--output", help="write the results as JSON to this path")
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="allowed latency/throughput drift against the baseline (fraction)",
+    )
+    parser.add_argument(
+        "--database", default=os.path.join(tempfile.gettempdir(), "bench.db")
+    )
+    args = parser.parse_args(argv)
+    unknown = set(args.flows) - set(FLOWS)
+    if unknown:
+        parser.error(f"unknown flows: {', '.join(sorted(unknown))}")
+
+    # Settings are read from the repository's .env; the database is replaced
+    os.chdir(ROOT)
+    sys.path.insert(0, str(ROOT))
+    from bench import standin
+    from bench.report import compare, format_table
+
+    standin.configure(args.database)
+    # Measure login itself, not the throttle in front of it
+    for setting in ("LOGIN_IP_RATE_PER_MINUTE", "LOGIN_USERNAME_RATE_PER_MINUTE"):
+        os.environ.setdefault(setting, "0")
+    # Coalescing depends on timing, which would make query counts vary by run
+    os.environ.setdefault("SINGLE_FLIGHT_METHODS", "[]")
+    results = asyncio.run(run(args))
+    print(format_table(results))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
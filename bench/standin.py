@@ -0,0 +1,55 @@
+"""Local SQLite stand-in for the Postgres database used by the benchmarks.
+
+Import this module before anything from ``src`` so that the app's engines are
+built against the stand-in URL.
+"""
+
+import os
+import uuid
+
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import sqltypes
+
+
+def configure(path: str) -> str:
+    """Point the app at a fresh SQLite file and return its URL"""
+    if os.path.exists(path):
+        os.remove(path)
+    url = f"sqlite+aiosqlite:///{path}"
+    os.environ["DATABASE_URL"] = url
+    os.environ.pop("DATABASE_REPLICA_URL", None)
+    return url
+
+
+@compiles(TSVECTOR, "sqlite")
+def _compile_tsvector(type_, compiler, **kw):
+    return "TEXT"
+
+
+@event.listens_for(Engine, "connect")
+def _register_functions(dbapi_connection, connection_record):
+    # Enough of the full-text functions for the generated search column
+    dbapi_connection.create_function(
+        "to_tsvector", 2, lambda config, text: text, deterministic=True
+    )
+    dbapi_connection.create_function(
+        "setweight", 2, lambda vector, weight: vector, deterministic=True
+    )
+
+
+_uuid_bind_processor = sqltypes.Uuid.bind_processor
+
+
+def _coercing_bind_processor(self, dialect):
+    # Path parameters reach the services as strings; asyncpg accepts them,
+    # the SQLite driver needs uuid.UUID
+    process = _uuid_bind_processor(self, dialect)
+    if process is None:
+        return None
+    return lambda value: process(uuid.UUID(value) if isinstance(value, str) else value)
+
+
+sqltypes.Uuid.bind_processor = _coercing_bind_processor
@@ -0,0 +1,60 @@
+"""initial schema
+
+Revision ID: 0001_initial
+Revises:
+Create Date: 2025-06-06 00:00:00.000000
+
+Databases created by init_db() before migrations existed already match this
+revision and can be adopted with ``alembic stamp 0001_initial``.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0001_initial"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "books",
+        sa.Column("uid", postgresql.UUID(), nullable=False),
+        sa.Column("title", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("author", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("year", sa.Integer(), nullable=False),
+        sa.Column("description", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("created_at", postgresql.TIMESTAMP(), nullable=True),
+        sa.Column("updated_at", postgresql.TIMESTAMP(), nullable=True),
+        sa.PrimaryKeyConstraint("uid"),
+    )
+    op.create_table(
+        "users",
+        sa.Column("uid", postgresql.UUID(), nullable=False),
+        sa.Column(
+            "username", sqlmodel.sql.sqltypes.AutoString(length=8), nullable=False
+        ),
+        sa.Column(
+            "password_hash", sqlmodel.sql.sqltypes.AutoString(length=8), nullable=False
+        ),
+        sa.Column("email", sqlmodel.sql.sqltypes.AutoString(length=40), nullable=False),
+        sa.Column("isVerified", sa.Boolean(), nullable=False),
+        sa.Column("created_at", postgresql.TIMESTAMP(), nullable=True),
+        sa.Column("updated_at", postgresql.TIMESTAMP(), nullable=True),
+        sa.PrimaryKeyConstraint("uid"),
+        sa.UniqueConstraint("email"),
+        sa.UniqueConstraint("username"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("users")
+    op.drop_table("books")
@@ -0,0 +1,33 @@
+"""keyset pagination indexes
+
+Revision ID: 0002_keyset_indexes
+Revises: 0001_initial
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0002_keyset_indexes"
+down_revision: Union[str, Sequence[str], None] = "0001_initial"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_books_created_at_uid", "books", ["created_at", "uid"], unique=False
+    )
+    op.create_index(
+        "ix_users_created_at_uid", "users", ["created_at", "uid"], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_users_created_at_uid", table_name="users")
+    op.drop_index("ix_books_created_at_uid", table_name="books")
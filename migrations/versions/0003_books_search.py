@@ -0,0 +1,48 @@
+"""books full-text search
+
+Revision ID: 0003_books_search
+Revises: 0002_keyset_indexes
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from src.books.models import BOOK_SEARCH_DOCUMENT
+
+# revision identifiers, used by Alembic.
+revision: str = "0003_books_search"
+down_revision: Union[str, Sequence[str], None] = "0002_keyset_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Generated column: existing rows are filled in when it is added
+    op.add_column(
+        "books",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed(BOOK_SEARCH_DOCUMENT, persisted=True),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        "ix_books_search_vector",
+        "books",
+        ["search_vector"],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_books_search_vector", table_name="books", postgresql_using="gin")
+    op.drop_column("books", "search_vector")
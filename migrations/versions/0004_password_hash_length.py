@@ -0,0 +1,40 @@
+"""widen users.password_hash to hold bcrypt and argon2 hashes
+
+Revision ID: 0004_password_hash_length
+Revises: 0003_books_search
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlmodel
+
+# revision identifiers, used by Alembic.
+revision: str = "0004_password_hash_length"
+down_revision: Union[str, Sequence[str], None] = "0003_books_search"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.alter_column(
+        "users",
+        "password_hash",
+        existing_type=sqlmodel.sql.sqltypes.AutoString(length=8),
+        type_=sqlmodel.sql.sqltypes.AutoString(length=255),
+        existing_nullable=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column(
+        "users",
+        "password_hash",
+        existing_type=sqlmodel.sql.sqltypes.AutoString(length=255),
+        type_=sqlmodel.sql.sqltypes.AutoString(length=8),
+        existing_nullable=False,
+    )
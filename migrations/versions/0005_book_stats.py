@@ -0,0 +1,44 @@
+"""book counts per author and year
+
+Revision ID: 0005_book_stats
+Revises: 0004_password_hash_length
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+# revision identifiers, used by Alembic.
+revision: str = "0005_book_stats"
+down_revision: Union[str, Sequence[str], None] = "0004_password_hash_length"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "book_stats",
+        sa.Column("dimension", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("value", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("book_count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("dimension", "value"),
+    )
+    # Count the books that already exist
+    op.execute(
+        "INSERT INTO book_stats (dimension, value, book_count) "
+        "SELECT 'author', author, count(*) FROM books GROUP BY author"
+    )
+    op.execute(
+        "INSERT INTO book_stats (dimension, value, book_count) "
+        "SELECT 'year', CAST(year AS VARCHAR), count(*) FROM books GROUP BY year"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("book_stats")
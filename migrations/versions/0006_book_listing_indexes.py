@@ -0,0 +1,47 @@
+"""indexes for the book listing filters and sort keys
+
+Revision ID: 0006_book_listing_indexes
+Revises: 0005_book_stats
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0006_book_listing_indexes"
+down_revision: Union[str, Sequence[str], None] = "0005_book_stats"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_books_author_created_at_uid",
+        "books",
+        ["author", "created_at", "uid"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_books_year_created_at_uid",
+        "books",
+        ["year", "created_at", "uid"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_books_author_pattern",
+        "books",
+        ["author"],
+        unique=False,
+        postgresql_ops={"author": "varchar_pattern_ops"},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_books_author_pattern", table_name="books")
+    op.drop_index("ix_books_year_created_at_uid", table_name="books")
+    op.drop_index("ix_books_author_created_at_uid", table_name="books")
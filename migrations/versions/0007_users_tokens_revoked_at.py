@@ -0,0 +1,34 @@
+"""durable token revocation time on users
+
+Revision ID: 0007_users_tokens_revoked_at
+Revises: 0006_book_listing_indexes
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0007_users_tokens_revoked_at"
+down_revision: Union[str, Sequence[str], None] = "0006_book_listing_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "users",
+        sa.Column(
+            "tokens_revoked_at", postgresql.TIMESTAMP(timezone=True), nullable=True
+        ),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("users", "tokens_revoked_at")
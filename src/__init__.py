@@ -1,22 +1,111 @@
-from fastapi import FastAPI
-from src.books.route import book_router
+from .bootstrap import import_started
+import logging
+import math
+import time
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+from src.books.route import book_changes, book_router
 from contextlib import asynccontextmanager
-from src.db.main import init_db
+from src.db.main import close_db, init_db, listen_engine, verify_db, warm_pool
 from .users.routes import user_router
+from .auth.revocation import revocation_feed
 from .auth.route import auth_router
+from .config import Config
+from .users.security import hash_executor, password_hasher
+from .util.admission import (
+    AdmissionController,
+    AdmissionMiddleware,
+    build_classes,
+    install_statement_deadlines,
+)
+from .util.executor import ExecutorSaturatedError
+from .util.logs import configure_logging
+from .util.changes import FeedListener
+from .util.compression import CompressionMiddleware
+from .util.metrics import MetricsMiddleware, install_db_metrics, registry
+from .util.ratelimit import RateLimitedError
+from .util.response import NegotiationMiddleware
+from .util.startup import StartupTimer
+
+configure_logging(Config.LOG_LEVEL)
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def life_span(app: FastAPI):
-    print("server is starting ...")
-    await init_db()
+    logger.info("server is starting ...")
+    if Config.STARTUP_MODE == "verify":
+        with startup_timer.phase("schema"):
+            await verify_db(Config.ALEMBIC_CONFIG)
+    else:
+        with startup_timer.phase("schema"):
+            await init_db()
+    if Config.DB_POOL_WARMUP:
+        with startup_timer.phase("pool_warmup"):
+            await warm_pool(Config.DB_POOL_WARMUP)
+    if Config.PASSWORD_HASH_CALIBRATE:
+        with startup_timer.phase("password_calibration"):
+            await password_hasher.calibrate()
+    logger.info(startup_timer.report())
+    await feed_listener.start(listen_engine)
     yield
-    print("server has been stopped")
+    await feed_listener.stop()
+    hash_executor.shutdown()
+    await close_db()
+    logger.info("server has been stopped")
 
 
 version = "v1"
 app = FastAPI(title="Book API", version=version, lifespan=life_span)
+startup_timer = StartupTimer()
+feed_listener = FeedListener([book_changes, revocation_feed])
+install_db_metrics()
+app.add_middleware(NegotiationMiddleware)
+if Config.RESPONSE_COMPRESSION:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=Config.RESPONSE_COMPRESSION_MIN_BYTES,
+        gzip_level=Config.RESPONSE_GZIP_LEVEL,
+        zstd_level=Config.RESPONSE_ZSTD_LEVEL,
+    )
+if Config.ADMISSION_CONTROL:
+    install_statement_deadlines()
+    app.add_middleware(
+        AdmissionMiddleware,
+        controller=AdmissionController(
+            build_classes(Config.ADMISSION_CLASSES), Config.ADMISSION_MAX_CONCURRENT
+        ),
+        routes=Config.ADMISSION_ROUTES,
+    )
+# Added last, so it is outermost and its timings include the layers above
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(book_router, prefix=f"/{version}/books", tags=["books"])
 app.include_router(user_router, prefix=f"/{version}/users", tags=["users"])
 app.include_router(auth_router, prefix=f"/{version}/auth", tags=["auth"])
+startup_timer.record("import", time.perf_counter() - import_started)
+
+
+@app.exception_handler(ExecutorSaturatedError)
+async def executor_saturated_handler(request: Request, exc: ExecutorSaturatedError):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server is busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(RateLimitedError)
+async def rate_limited_handler(request: Request, exc: RateLimitedError):
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(max(math.ceil(exc.retry_after), 1))},
+    )
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,96 @@
+import json
+import time
+from typing import Optional
+
+from src.config import Config
+from src.util.changes import ChangeEvent, ChangeFeed
+
+
+class TokenRevocationStore:
+    """In-process record of when each user's tokens were last revoked.
+
+    A token is rejected when it was issued at or before its user's revocation
+    time. Entries only need to outlive the longest token lifetime, after which
+    every token they could reject has expired anyway, so the store stays small.
+    The durable record is users.tokens_revoked_at; the store only spares
+    stateless auth that lookup for tokens it can vouch for.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        # Insertion order doubles as revocation order, oldest first
+        self._revoked_at: dict[str, float] = {}
+        # Revocations made before this process started are unknown to it
+        self.trusted_since = time.time()
+
+    def trusts(self, issued_at: float) -> bool:
+        """Whether this store knows every revocation that could affect a token.
+
+        Tokens issued earlier must be checked against the users table.
+        """
+        return issued_at > self.trusted_since
+
+    def distrust_earlier(self) -> None:
+        """Send tokens issued until now to the users table.
+
+        Called when revocations may have been missed, such as while the
+        feed's LISTEN connection was down.
+        """
+        self.trusted_since = time.time()
+
+    def revoke_user(self, uid, revoked_at: Optional[float] = None) -> None:
+        """Invalidate every token issued to the user up to ``revoked_at`` (now).
+
+        A repeated revocation never moves the time back, so workers that
+        apply the same revocation late do not undo a newer one.
+        """
+        now = time.time()
+        key = str(uid)
+        revoked_at = max(revoked_at or now, self._revoked_at.pop(key, 0))
+        self._revoked_at[key] = revoked_at
+        self._purge(now)
+
+    def is_revoked(self, uid, issued_at: float) -> bool:
+        revoked_at = self._revoked_at.get(str(uid))
+        if revoked_at is None:
+            return False
+        if time.time() - revoked_at > self.ttl_seconds:
+            self._revoked_at.pop(str(uid), None)
+            return False
+        return issued_at <= revoked_at
+
+    def _purge(self, now: float) -> None:
+        """Drop entries older than the TTL from the front of the store"""
+        while self._revoked_at:
+            key, revoked_at = next(iter(self._revoked_at.items()))
+            if now - revoked_at <= self.ttl_seconds:
+                break
+            del self._revoked_at[key]
+
+    def __len__(self) -> int:
+        return len(self._revoked_at)
+
+
+revocation_store = TokenRevocationStore(
+    ttl_seconds=max(
+        Config.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        Config.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60,
+    )
+)
+# Revocations made by any worker reach every worker's store through this
+# feed when notify is on; otherwise it stays within the process
+revocation_feed = ChangeFeed(
+    "token_revocations", buffer_size=0, notify=Config.BOOK_CHANGES_NOTIFY
+)
+
+
+def _apply_revocation(change: ChangeEvent) -> None:
+    if change.type == "reset":
+        # Notifications were lost, so fail closed rather than trust the store
+        revocation_store.distrust_earlier()
+    elif change.type == "revoked":
+        data = json.loads(change.data)
+        revocation_store.revoke_user(data["uid"], data["revoked_at"])
+
+
+revocation_feed.observe(_apply_revocation)
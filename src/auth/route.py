@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from fastapi.security import OAuth2PasswordBearer
 from .schema import LoginRequest, TokenResponse, UserProfile
 from .service import AuthService
 from sqlmodel.ext.asyncio.session import AsyncSession
 from ..db.main import get_session
 from ..dependencies import AccessTokenBearer
+from .throttle import login_throttle
 
 
 auth_router = APIRouter()
@@ -13,8 +14,15 @@ access_token_bearer = AccessTokenBearer()
 
 
 @auth_router.post("/login", response_model=TokenResponse)
-async def login(request: LoginRequest, session: AsyncSession = Depends(get_session)):
-    return await AuthService.login(request, session)
+async def login(
+    request: LoginRequest,
+    http_request: Request,
+    session: AsyncSession = Depends(get_session),
+):
+    # Behind a proxy, run uvicorn with --proxy-headers so this is the client
+    client_ip = http_request.client.host if http_request.client else None
+    with login_throttle.admit(client_ip, request.username):
+        return await AuthService.login(request, session)
 
 
 @auth_router.post("/refresh-token", response_model=TokenResponse)
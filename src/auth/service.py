@@ -28,7 +28,7 @@ class AuthService:
     ) -> TokenResponse:
         user = await authUtil.get_user(request.username, sessions)
 
-        if not user or not authUtil.verify_password(
+        if not user or not await authUtil.verify_password_async(
             request.password, user.password_hash
         ):
             raise HTTPException(
@@ -37,6 +37,7 @@ class AuthService:
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
+        await authUtil.rehash_password_if_needed(user, request.password, sessions)
         token = authUtil.generate_token(user)
         return TokenResponse(
             access_token=token.access_token,
@@ -0,0 +1,67 @@
+from contextlib import contextmanager
+from typing import Optional
+
+from src.config import Config
+from src.util.metrics import registry
+from src.util.ratelimit import (
+    ConcurrencyLimiter,
+    RateLimitedError,
+    TokenBucketLimiter,
+)
+
+login_throttled = registry.counter(
+    "login_throttled_total", "Login attempts rejected by the throttle, by reason"
+)
+
+
+class LoginThrottle:
+    """Token buckets per client IP and per username plus a concurrency cap.
+
+    Attempts are charged whether or not they succeed.
+    """
+
+    def __init__(
+        self,
+        ip_limiter: TokenBucketLimiter,
+        username_limiter: TokenBucketLimiter,
+        concurrency: ConcurrencyLimiter,
+    ):
+        self.ip_limiter = ip_limiter
+        self.username_limiter = username_limiter
+        self.concurrency = concurrency
+
+    @contextmanager
+    def admit(self, client_ip: Optional[str], username: str):
+        """Raise RateLimitedError, or hold a concurrency slot for the block"""
+        retry_after = self.ip_limiter.acquire(client_ip or "unknown")
+        if retry_after:
+            login_throttled.inc(reason="ip")
+            raise RateLimitedError(retry_after, "Too many login attempts")
+        retry_after = self.username_limiter.acquire(username.strip().lower())
+        if retry_after:
+            login_throttled.inc(reason="username")
+            raise RateLimitedError(retry_after, "Too many login attempts")
+        try:
+            self.concurrency.acquire()
+        except RateLimitedError:
+            login_throttled.inc(reason="concurrency")
+            raise
+        try:
+            yield
+        finally:
+            self.concurrency.release()
+
+
+login_throttle = LoginThrottle(
+    TokenBucketLimiter(
+        Config.LOGIN_IP_RATE_PER_MINUTE / 60,
+        Config.LOGIN_IP_BURST,
+        Config.LOGIN_THROTTLE_MAX_KEYS,
+    ),
+    TokenBucketLimiter(
+        Config.LOGIN_USERNAME_RATE_PER_MINUTE / 60,
+        Config.LOGIN_USERNAME_BURST,
+        Config.LOGIN_THROTTLE_MAX_KEYS,
+    ),
+    ConcurrencyLimiter(Config.LOGIN_MAX_CONCURRENT),
+)
@@ -1,15 +1,23 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import logging
+import time
 from typing import Optional
 from fastapi import HTTPException, status
-import jwt
-from sqlmodel import select
+from sqlmodel import select, update
 from sqlmodel.ext.asyncio.session import AsyncSession
-from passlib.context import CryptContext
 
 from ..users.models import Users
+from ..users.security import (
+    get_password_hash,
+    get_password_hash_async,
+    password_hasher,
+    verify_password,
+    verify_password_async,
+)
 from src.config import Config
-from .schema import TokenResponse
+from src.util.singleflight import single_flight
+from .revocation import revocation_store
+from .schema import TokenResponse, UserProfile
 
 
 class AuthConfig:
@@ -22,11 +30,13 @@ class AuthConfig:
     REFRESH_TOKEN_EXPIRE_DAYS = Config.REFRESH_TOKEN_EXPIRE_DAYS
 
 
+user_flight = single_flight("AuthUtil.get_user", Config.SINGLE_FLIGHT_METHODS)
+
+
 class AuthUtil:
     """Authentication utility class with optimized methods"""
 
     def __init__(self):
-        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
         self.credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
@@ -35,22 +45,48 @@ class AuthUtil:
 
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
         """Verify a plain password against its hash"""
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return verify_password(plain_password, hashed_password)
+
+    async def verify_password_async(
+        self, plain_password: str, hashed_password: str
+    ) -> bool:
+        """Verify a password on the hashing executor, off the event loop"""
+        return await verify_password_async(plain_password, hashed_password)
 
     def get_password_hash(self, password: str) -> str:
         """Generate password hash"""
-        return self.pwd_context.hash(password)
+        return get_password_hash(password)
+
+    async def rehash_password_if_needed(
+        self, user: Users, password: str, session: AsyncSession
+    ) -> None:
+        """Upgrade a just-verified password to the current scheme and cost"""
+        if not Config.PASSWORD_REHASH_ON_LOGIN or not password_hasher.needs_rehash(
+            user.password_hash
+        ):
+            return
+        try:
+            new_hash = await get_password_hash_async(password)
+            # Compare-and-set on the old hash. The instance may be shared by
+            # coalesced logins, so it is not modified.
+            await session.exec(
+                update(Users)
+                .where(Users.uid == user.uid)
+                .where(Users.password_hash == user.password_hash)
+                .values(password_hash=new_hash)
+            )
+            await session.commit()
+        except Exception as e:
+            # The old hash still works; the next login tries again
+            await session.rollback()
+            logging.warning(f"Could not rehash password for {user.username}: {e}")
 
     def generate_token(self, user: Users) -> TokenResponse:
         """Generate access and refresh tokens for a user"""
         now = datetime.utcnow()  # Use UTC for consistency
 
         # Base payload
-        base_payload = {
-            "uid": str(user.uid),
-            "username": user.username,
-            "email": user.email,
-        }
+        base_payload = self._user_claims(user)
 
         # Access token payload
         access_payload = {
@@ -73,17 +109,32 @@ class AuthUtil:
             access_token=access_token, refresh_token=refresh_token, token_type="bearer"
         )
 
+    def _user_claims(self, user: Users) -> dict:
+        """Claims that let a token stand in for the user without a DB lookup"""
+        return {
+            "uid": str(user.uid),
+            "username": user.username,
+            "email": user.email,
+            "isVerified": user.isVerified,
+            "created_at": user.created_at.isoformat() if user.created_at else None,
+            "updated_at": user.updated_at.isoformat() if user.updated_at else None,
+            "iat": time.time(),
+        }
+
     def _create_token(self, payload: dict, secret_key: str) -> str:
         """Internal method to create JWT tokens"""
+        # Imported on first use: jwt pulls in cryptography, which slows startup
+        import jwt
+
         return jwt.encode(payload, secret_key, algorithm=AuthConfig.ALGORITHM)
 
-    async def verify_token(
-        self, token: str, session: AsyncSession, is_refresh_token: bool = False
-    ) -> Users:
+    def decode_token(self, token: str, is_refresh_token: bool = False) -> dict:
+        """Decode a token and reject it if expired, malformed or revoked"""
         secret_key = (
             AuthConfig.REFRESH_SECRET if is_refresh_token else AuthConfig.SECRET_KEY
         )
         expected_type = "refresh" if is_refresh_token else "access"
+        import jwt
 
         try:
             payload = jwt.decode(token, secret_key, algorithms=[AuthConfig.ALGORITHM])
@@ -92,10 +143,11 @@ class AuthUtil:
             if payload.get("type") != expected_type:
                 raise self.credentials_exception
 
-            username = payload.get("username")
-            if not username:
+            if not payload.get("username"):
                 raise self.credentials_exception
 
+        except HTTPException:
+            raise
         except jwt.ExpiredSignatureError:
             logging.warning("Token has expired")
             raise HTTPException(
@@ -110,19 +162,74 @@ class AuthUtil:
             logging.error(f"Unexpected error during token verification: {e}")
             raise self.credentials_exception
 
+        if revocation_store.is_revoked(payload.get("uid"), payload.get("iat", 0)):
+            logging.warning(f"Revoked token for user: {payload.get('username')}")
+            raise self.credentials_exception
+
+        return payload
+
+    def verify_token_claims(
+        self, token: str, is_refresh_token: bool = False
+    ) -> UserProfile:
+        """Build the principal from the signed claims without touching the DB"""
+        return self._profile(self.decode_token(token, is_refresh_token))
+
+    async def verify_access_claims(
+        self, token: str, session: AsyncSession
+    ) -> UserProfile:
+        """verify_token_claims, plus a users table check for tokens the
+        in-process revocation store cannot vouch for"""
+        payload = self.decode_token(token)
+        if not revocation_store.trusts(payload.get("iat", 0)):
+            await self._verified_user(payload, session)
+        return self._profile(payload)
+
+    def _profile(self, payload: dict) -> UserProfile:
+        try:
+            return UserProfile.model_validate(payload)
+        except ValueError:
+            # Tokens issued before the profile claims were added
+            raise self.credentials_exception
+
+    async def verify_token(
+        self, token: str, session: AsyncSession, is_refresh_token: bool = False
+    ) -> Users:
+        payload = self.decode_token(token, is_refresh_token)
+        return await self._verified_user(payload, session)
+
+    async def _verified_user(self, payload: dict, session: AsyncSession) -> Users:
+        """The token's user, if it still exists and has not revoked the token"""
+        username = payload["username"]
+
         # Get user from database
         user = await self.get_user(username, session)
-        if not user:
+        if not user or ("uid" in payload and str(user.uid) != payload["uid"]):
             logging.warning(f"User not found: {username}")
             raise self.credentials_exception
 
+        revoked_at = user.tokens_revoked_at
+        if revoked_at is not None:
+            if revoked_at.tzinfo is None:
+                revoked_at = revoked_at.replace(tzinfo=timezone.utc)
+            if payload.get("iat", 0) <= revoked_at.timestamp():
+                logging.warning(f"Revoked token for user: {username}")
+                raise self.credentials_exception
+
         return user
 
     async def get_user(self, username: str, session: AsyncSession) -> Optional[Users]:
-        """Retrieve user by username from database"""
-        try:
+        """Retrieve user by username from database.
+
+        Concurrent lookups of one username share a single query and therefore
+        the same read-only instance.
+        """
+
+        async def load():
             result = await session.exec(select(Users).where(Users.username == username))
             return result.first()
+
+        try:
+            return await user_flight.do(username, load)
         except Exception as e:
             logging.error(f"Database error while fetching user {username}: {e}")
             return None
@@ -136,9 +243,7 @@ class AuthUtil:
         # Generate new access token (keep existing refresh token)
         now = datetime.utcnow()
         access_payload = {
-            "uid": str(user.uid),
-            "username": user.username,
-            "email": user.email,
+            **self._user_claims(user),
             "exp": now + timedelta(minutes=AuthConfig.ACCESS_TOKEN_EXPIRE_MINUTES),
             "type": "access",
         }
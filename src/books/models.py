@@ -1,16 +1,29 @@
 from datetime import datetime
 import uuid
-from sqlmodel import SQLModel, Field, Column
+from sqlalchemy import Computed
+from sqlmodel import SQLModel, Field, Column, Index
 import sqlalchemy.dialects.postgresql as pg
 
 
 class Books(SQLModel, table=True):
     __tablename__ = "books"
+    __table_args__ = (
+        # Keyset pagination walks (created_at, uid) in descending order
+        Index("ix_books_created_at_uid", "created_at", "uid"),
+        # Listing filters and sort keys, one index per leading column; see
+        # BookService._pageStatement and tests/test_explain.py
+        Index("ix_books_author_created_at_uid", "author", "created_at", "uid"),
+        Index("ix_books_year_created_at_uid", "year", "created_at", "uid"),
+        # LIKE 'prefix%' only uses an index with pattern ops under non-C collations
+        Index(
+            "ix_books_author_pattern",
+            "author",
+            postgresql_ops={"author": "varchar_pattern_ops"},
+        ),
+    )
 
     uid: uuid.UUID = Field(
-        sa_column=Column(
-            pg.UUID, nullable=False, primary_key=True, default=uuid.uuid4()
-        )
+        sa_column=Column(pg.UUID, nullable=False, primary_key=True, default=uuid.uuid4)
     )
     title: str
     author: str
@@ -20,5 +33,37 @@ class Books(SQLModel, table=True):
     updated_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now))
 
 
+# Weighted full-text document, maintained by Postgres on every insert and
+# update. It is added to the table after mapping so ORM loads never fetch it.
+BOOK_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(author, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'C')"
+)
+Books.__table__.append_column(
+    Column(
+        "search_vector",
+        pg.TSVECTOR,
+        Computed(BOOK_SEARCH_DOCUMENT, persisted=True),
+    )
+)
+Index(
+    "ix_books_search_vector",
+    Books.__table__.c.search_vector,
+    postgresql_using="gin",
+)
+
+
+class BookStats(SQLModel, table=True):
+    """Book counts per author and per year, maintained by BookService writes"""
+
+    __tablename__ = "book_stats"
+
+    # "author" or "year"; value is the author name or the year as text
+    dimension: str = Field(primary_key=True)
+    value: str = Field(primary_key=True)
+    book_count: int = 0
+
+
 def __repr__(self):
     return f"<Book {self.title}>"
@@ -1,14 +1,88 @@
-from http.client import HTTPException
-from fastapi import APIRouter, Depends, status
-from src.books.schema import BookCreateModel, BookResponse, BookUpdateModel
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from src.books.schema import (
+    BookBatchRequest,
+    BookBatchResponse,
+    BookBatchUpdateRequest,
+    BookCreateModel,
+    BookFilters,
+    BookResponse,
+    BookSort,
+    BookStatsResponse,
+    BookUpdateModel,
+    BulkImportResponse,
+)
+import asyncio
+from datetime import datetime
+from typing import List, Literal, Optional
 from sqlmodel.ext.asyncio.session import AsyncSession
-from src.books.service import BookService
-from src.db.main import get_session
+from src.books.service import BOOK_FIELDS, DEFAULT_SORT, BookService
+from src.config import Config
+from src.db.main import get_read_session, get_session, session_scope
+from src.util.cache import create_cache
+from src.util.changes import ChangeFeed
+from src.util.fields import parse_fields, project
+from src.util.response import FastJSONResponse
+from src.util.metrics import registry
+from src.util.conditional import (
+    has_conditional_headers,
+    is_not_modified,
+    last_modified_of,
+    make_etag,
+    not_modified,
+    set_validators,
+)
+from src.util.pagination import (
+    encode_keyset_cursor,
+    encode_rank_cursor,
+    set_next_cursor,
+)
+from src.util.stream import (
+    encode_csv,
+    encode_ndjson,
+    iter_csv,
+    iter_lines,
+    iter_ndjson,
+)
 
 
-book_router = APIRouter()
-book_service = BookService()
+book_router = APIRouter(default_response_class=FastJSONResponse)
+book_changes = ChangeFeed(
+    "book_changes",
+    buffer_size=Config.BOOK_CHANGES_BUFFER,
+    queue_size=Config.BOOK_CHANGES_QUEUE_SIZE,
+    max_subscribers=Config.BOOK_CHANGES_MAX_SUBSCRIBERS,
+    notify=Config.BOOK_CHANGES_NOTIFY,
+)
+book_service = BookService(
+    cache=create_cache(
+        Config.BOOK_CACHE_BACKEND,
+        url=Config.BOOK_CACHE_URL,
+        max_entries=Config.BOOK_CACHE_MAX_ENTRIES,
+        ttl=Config.BOOK_CACHE_TTL_SECONDS,
+    ),
+    changes=book_changes,
+)
+
+
+def _forget_change(change) -> None:
+    # Writes invalidate the writer's cache; this reaches the other workers'
+    asyncio.get_running_loop().create_task(book_service.forgetChange(change))
+
+
+if book_changes.notify and book_service.cache and not book_service.cache.shared:
+    book_changes.observe(_forget_change)
+
+book_cache_state = registry.gauge("book_cache", "Book read cache counters by stat")
+
+
+def _collect_cache_stats() -> None:
+    if book_service.cache:
+        for stat, value in book_service.cache.stats().items():
+            book_cache_state.set(value, stat=stat)
+
+
+registry.add_collector(_collect_cache_stats)
 
 
 @book_router.post("", status_code=status.HTTP_201_CREATED, response_model=BookResponse)
@@ -20,14 +94,107 @@ async def createBook(
         session,
     )
     if bookCreateData:
-        return bookCreateData
+        return FastJSONResponse(
+            book_service.bookDict(bookCreateData),
+            status_code=status.HTTP_201_CREATED,
+        )
     else:
-        return HTTPException(
+        raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Failed to create book",
         )
 
 
+@book_router.post("/bulk", response_model=BulkImportResponse)
+async def bulk_import_books(
+    request: Request, session: AsyncSession = Depends(get_session)
+):
+    """Import books from a streamed NDJSON or CSV body (with a header row)"""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    max_length = Config.BULK_IMPORT_MAX_LINE_LENGTH
+    lines = iter_lines(request.stream(), max_length)
+    if content_type in ("text/csv", "application/csv"):
+        records = iter_csv(lines, max_length)
+    elif content_type in (
+        "application/x-ndjson",
+        "application/ndjson",
+        "application/jsonl",
+        "application/json-lines",
+    ):
+        records = iter_ndjson(lines)
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Expected an application/x-ndjson or text/csv body",
+        )
+
+    return await book_service.importBooks(
+        records,
+        session,
+        batch_size=Config.BULK_IMPORT_BATCH_SIZE,
+        max_errors=Config.BULK_IMPORT_MAX_ERRORS,
+    )
+
+
+def _check_batch_size(size: int) -> None:
+    if size > Config.BOOK_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {Config.BOOK_BATCH_MAX_ITEMS} books per batch",
+        )
+
+
+def _batch_response(book_uids, found, books=None) -> FastJSONResponse:
+    books = books or [None] * len(book_uids)
+    results = [
+        {
+            "uid": book_uid,
+            "status": status.HTTP_200_OK if ok else status.HTTP_404_NOT_FOUND,
+            "book": book,
+        }
+        for book_uid, ok, book in zip(book_uids, found, books)
+    ]
+    return FastJSONResponse({"results": results})
+
+
+@book_router.post("/batch-get", response_model=BookBatchResponse)
+async def batch_get_books(
+    batch: BookBatchRequest, session: AsyncSession = Depends(get_read_session)
+):
+    """Fetch several books with one query; results follow the request order"""
+    _check_batch_size(len(batch.uids))
+    books = await book_service.getBookRows(batch.uids, session)
+    return _batch_response(batch.uids, [book is not None for book in books], books)
+
+
+@book_router.patch("/batch", response_model=BookBatchResponse)
+async def batch_update_books(
+    batch: BookBatchUpdateRequest, session: AsyncSession = Depends(get_session)
+):
+    """Apply partial updates to several books in one transaction"""
+    _check_batch_size(len(batch.items))
+    updates = [
+        (item.uid, item.model_dump(exclude={"uid"}, exclude_none=True))
+        for item in batch.items
+    ]
+    books = await book_service.updateBooks(updates, session)
+    return _batch_response(
+        [item.uid for item in batch.items],
+        [book is not None for book in books],
+        books,
+    )
+
+
+@book_router.post("/batch-delete", response_model=BookBatchResponse)
+async def batch_delete_books(
+    batch: BookBatchRequest, session: AsyncSession = Depends(get_session)
+):
+    """Delete several books in one transaction"""
+    _check_batch_size(len(batch.uids))
+    deleted = await book_service.deleteBooks(batch.uids, session)
+    return _batch_response(batch.uids, deleted)
+
+
 @book_router.patch("/{book_id}", response_model=BookResponse)
 async def updateBook(
     book_id: str,
@@ -36,8 +203,8 @@ async def updateBook(
 ):
     bookUpdateData = await book_service.updateBook(book_id, book_update, session)
     if bookUpdateData:
-        return bookUpdateData
-    return HTTPException(
+        return FastJSONResponse(bookUpdateData)
+    raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
         detail="Book not found",
     )
@@ -45,17 +212,196 @@ async def updateBook(
 
 @book_router.get("", response_model=List[BookResponse])
 async def get_books(
-    session: AsyncSession = Depends(get_session), skip: int = 0, limit: int = 100
+    request: Request,
+    session: AsyncSession = Depends(get_read_session),
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(
+        None, description="Comma-separated subset of fields, e.g. uid,title,author"
+    ),
+    author: Optional[str] = None,
+    author_prefix: Optional[str] = Query(None, min_length=1),
+    year_min: Optional[int] = None,
+    year_max: Optional[int] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    sort: BookSort = DEFAULT_SORT,
 ):
-    return await book_service.getBooks(session, skip, limit)
+    filters = BookFilters(
+        author=author,
+        author_prefix=author_prefix,
+        year_min=year_min,
+        year_max=year_max,
+        created_after=created_after,
+        created_before=created_before,
+    )
+    sort_columns = book_service.sortColumns(sort)
+    # Only the unfiltered, default-ordered first page is cached
+    cacheable = (
+        book_service.cache
+        and not skip
+        and not cursor
+        and sort == DEFAULT_SORT
+        and not filters.model_dump(exclude_none=True)
+    )
+    try:
+        selected = parse_fields(fields, BOOK_FIELDS)
+        # Sparse responses are a different representation with their own ETag
+        variant = "" if selected == BOOK_FIELDS else ",".join(selected)
+        if has_conditional_headers(request) and not cacheable:
+            # Cheap probe of the page's versions before loading full rows
+            versions = await book_service.getBookVersions(
+                session, skip, limit, cursor, filters, sort
+            )
+            page = [(version["uid"], version["updated_at"]) for version in versions]
+            etag, last_modified = make_etag(page, variant), last_modified_of(page)
+            if is_not_modified(request, etag, last_modified):
+                response = not_modified(etag, last_modified)
+                if versions and len(versions) == limit:
+                    cursor = encode_keyset_cursor(versions[-1], sort_columns)
+                    set_next_cursor(request, response, cursor)
+                return response
+        if cacheable:
+            # The cached page holds every field and is trimmed below
+            books = await book_service.getBooksCached(session, limit)
+        else:
+            books = await book_service.getBooks(
+                session, skip, limit, cursor, selected, filters, sort
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    page = [(book["uid"], book["updated_at"]) for book in books]
+    etag, last_modified = make_etag(page, variant), last_modified_of(page)
+    # Cached first pages are revalidated here without touching the database
+    if is_not_modified(request, etag, last_modified):
+        response = not_modified(etag, last_modified)
+    else:
+        response = FastJSONResponse(project(books, selected) if variant else books)
+        set_validators(response, etag, last_modified)
+    if books and len(books) == limit:
+        set_next_cursor(
+            request, response, encode_keyset_cursor(books[-1], sort_columns)
+        )
+    return response
+
+
+@book_router.get("/search", response_model=List[BookResponse])
+async def search_books(
+    request: Request,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_read_session),
+):
+    """Rank books by how well their title, author and description match q"""
+    try:
+        results = await book_service.searchBooks(q, session, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    response = FastJSONResponse([book for book, _ in results])
+    if results and len(results) == limit:
+        last_book, last_rank = results[-1]
+        set_next_cursor(
+            request, response, encode_rank_cursor(last_rank, last_book["uid"])
+        )
+    return response
+
+
+@book_router.get("/export")
+async def export_books(
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+):
+    """Stream every book as NDJSON or CSV without loading the table in memory"""
+
+    async def body():
+        # The session must outlive the handler, so it is opened by the stream
+        async with session_scope(read_only=True) as session:
+            rows = book_service.streamBooks(session, Config.EXPORT_BATCH_SIZE)
+            if export_format == "csv":
+                chunks = encode_csv(rows, list(BookResponse.model_fields))
+            else:
+                chunks = encode_ndjson(rows)
+            async for chunk in chunks:
+                yield chunk
+
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="books.{export_format}"'
+        },
+    )
+
+
+@book_router.get("/stats", response_model=BookStatsResponse)
+async def book_stats(session: AsyncSession = Depends(get_read_session)):
+    """Book counts in total, per author and per year"""
+    return FastJSONResponse(await book_service.stats.getStats(session))
+
+
+@book_router.get("/changes")
+async def book_changes_stream(last_event_id: Optional[str] = Header(None)):
+    """Server-sent events for created, updated, deleted and imported books.
+
+    Reconnecting with Last-Event-ID replays what was missed while it is still
+    buffered; otherwise a "reset" event asks the client to reload. Streams
+    hold no database connection.
+    """
+    if book_changes.full():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many change feed subscribers",
+            headers={"Retry-After": "30"},
+        )
+
+    async def body():
+        # Subscribed only once the stream starts, so a client that leaves
+        # before then is never counted
+        with book_changes.subscribe(last_event_id) as subscription:
+            yield b"retry: 3000\n\n"
+            while not subscription.finished:
+                change = await subscription.next(Config.BOOK_CHANGES_KEEPALIVE_SECONDS)
+                if change is None:
+                    # Comment line: keeps proxies from closing an idle stream
+                    yield b": keepalive\n\n"
+                else:
+                    yield (
+                        f"id: {change.id}\nevent: {change.type}\n"
+                        f"data: {change.data}\n\n"
+                    ).encode()
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @book_router.get("/{book_uid}", response_model=BookResponse)
-async def get_book(book_uid: str, session: AsyncSession = Depends(get_session)):
-    bookData = await book_service.getBook(book_uid, session)
+async def get_book(
+    book_uid: str,
+    request: Request,
+    session: AsyncSession = Depends(get_read_session),
+):
+    if has_conditional_headers(request) and not book_service.cache:
+        # Answer revalidations from (uid, updated_at) alone when possible
+        version = await book_service.getBookVersion(book_uid, session)
+        if version:
+            etag, last_modified = make_etag([version]), version.updated_at
+            if is_not_modified(request, etag, last_modified):
+                return not_modified(etag, last_modified)
+    bookData = await book_service.getBookCached(book_uid, session)
     if bookData:
-        return bookData
-    return HTTPException(
+        updated_at = bookData["updated_at"]
+        etag = make_etag([(bookData["uid"], updated_at)])
+        if is_not_modified(request, etag, updated_at):
+            return not_modified(etag, updated_at)
+        response = FastJSONResponse(bookData)
+        set_validators(response, etag, updated_at)
+        return response
+    raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
         detail="Book not found",
     )
@@ -66,7 +412,7 @@ async def delete_book(book_uid: str, session: AsyncSession = Depends(get_session
     deleteResult = await book_service.deleteBook(book_uid, session)
     if deleteResult:
         return {"message": deleteResult}
-    return HTTPException(
+    raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
         detail="Book not found",
     )
@@ -1,6 +1,7 @@
 import uuid
 from pydantic import BaseModel
 from datetime import datetime
+from typing import List, Literal, Optional
 
 
 class Book(BaseModel):
@@ -30,8 +31,80 @@ class BookResponse(BaseModel):
     updated_at: datetime
 
 
+# Sort keys of the book listing; a leading "-" sorts descending
+BookSort = Literal["-created_at", "created_at", "-year", "year", "-author", "author"]
+
+
+class BookFilters(BaseModel):
+    author: Optional[str] = None
+    author_prefix: Optional[str] = None
+    year_min: Optional[int] = None
+    year_max: Optional[int] = None
+    # created_after is inclusive, created_before exclusive
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+
 class BookUpdateModel(BaseModel):
     title: str
     author: str
     year: int
     description: str
+
+
+class BulkRowError(BaseModel):
+    row: int
+    errors: List[str]
+
+
+class BulkImportResponse(BaseModel):
+    inserted: int = 0
+    failed: int = 0
+    errors: List[BulkRowError] = []
+    # Set once more rows failed than the report keeps
+    errors_truncated: bool = False
+
+
+class BookBatchRequest(BaseModel):
+    uids: List[uuid.UUID]
+
+
+class BookBatchUpdateItem(BaseModel):
+    uid: uuid.UUID
+    title: Optional[str] = None
+    author: Optional[str] = None
+    year: Optional[int] = None
+    description: Optional[str] = None
+
+
+class BookBatchUpdateRequest(BaseModel):
+    items: List[BookBatchUpdateItem]
+
+
+class BookBatchResult(BaseModel):
+    uid: uuid.UUID
+    status: int
+    book: Optional[BookResponse] = None
+
+
+class BookBatchResponse(BaseModel):
+    # One result per requested uid, in request order
+    results: List[BookBatchResult]
+
+
+class AuthorCount(BaseModel):
+    author: str
+    count: int
+
+
+class YearCount(BaseModel):
+    year: int
+    count: int
+
+
+class BookStatsResponse(BaseModel):
+    total: int
+    # Most books first
+    authors: List[AuthorCount]
+    # Oldest first
+    years: List[YearCount]
@@ -1,52 +1,572 @@
-from sqlmodel import select, desc
+from collections import Counter
+from datetime import datetime
+import json
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+import uuid
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import delete, func, insert, select, desc, tuple_, update
 from sqlmodel.ext.asyncio.session import AsyncSession
 from src.books.route import BookCreateModel
-from src.books.schema import BookUpdateModel
+from src.books.schema import (
+    BookFilters,
+    BookResponse,
+    BookUpdateModel,
+    BulkImportResponse,
+    BulkRowError,
+)
+from src.config import Config
+from src.util.cache import CacheBackend
+from src.util.changes import ChangeEvent, ChangeFeed
+from src.util.pagination import decode_keyset_cursor, decode_rank_cursor
+from src.util.singleflight import single_flight
 from .models import Books
+from .stats import BookStatsService
+
+# Response fields double as the columns read for API responses
+BOOK_FIELDS = tuple(BookResponse.model_fields)
+BOOK_COLUMNS = tuple(getattr(Books, field) for field in BOOK_FIELDS)
+# Always read: they build the page cursor and the ETag
+BOOK_KEY_FIELDS = ("uid", "created_at", "updated_at")
+
+DEFAULT_SORT = "-created_at"
+# Sort key -> keyset columns, each ending in (created_at, uid) so the order
+# is total. Every key leads an index; see Books.__table_args__.
+BOOK_SORTS = {
+    "created_at": (Books.created_at, Books.uid),
+    "year": (Books.year, Books.created_at, Books.uid),
+    "author": (Books.author, Books.created_at, Books.uid),
+}
+CURSOR_PARSERS = {
+    "created_at": datetime.fromisoformat,
+    "uid": uuid.UUID,
+    "year": int,
+    "author": str,
+}
+
+book_row_flight = single_flight("BookService.getBookRow", Config.SINGLE_FLIGHT_METHODS)
 
 
 class BookService:
 
-    async def getBooks(self, session: AsyncSession, skip: int = 0, limit: int = 100):
+    def __init__(
+        self,
+        cache: Optional[CacheBackend] = None,
+        changes: Optional[ChangeFeed] = None,
+    ):
+        self.cache = cache
+        self.changes = changes
+        self.stats = BookStatsService()
+        # Part of every item key; moved on to orphan all items at once
+        self.cacheEpoch = 0
+
+    def sortColumns(self, sort: str = DEFAULT_SORT) -> Tuple[str, ...]:
+        """Names of the keyset columns for ``sort``, which build its cursor"""
+        return tuple(column.key for column in BOOK_SORTS[sort.lstrip("-")])
+
+    def _filterClauses(self, filters: Optional[BookFilters]) -> list:
+        if filters is None:
+            return []
+        clauses = []
+        if filters.author is not None:
+            clauses.append(Books.author == filters.author)
+        if filters.author_prefix:
+            prefix = (
+                filters.author_prefix.replace("\\", "\\\\")
+                .replace("%", "\\%")
+                .replace("_", "\\_")
+            )
+            clauses.append(Books.author.like(f"{prefix}%", escape="\\"))
+        if filters.year_min is not None:
+            clauses.append(Books.year >= filters.year_min)
+        if filters.year_max is not None:
+            clauses.append(Books.year <= filters.year_max)
+        if filters.created_after is not None:
+            clauses.append(Books.created_at >= filters.created_after)
+        if filters.created_before is not None:
+            clauses.append(Books.created_at < filters.created_before)
+        return clauses
+
+    def _pageStatement(
+        self,
+        statement,
+        skip: int,
+        limit: int,
+        cursor: Optional[str],
+        filters: Optional[BookFilters] = None,
+        sort: str = DEFAULT_SORT,
+    ):
+        descending = sort.startswith("-")
+        columns = BOOK_SORTS[sort.lstrip("-")]
+        statement = statement.where(*self._filterClauses(filters))
+        statement = statement.order_by(
+            *(desc(column) if descending else column for column in columns)
+        )
+        statement = statement.limit(limit)
+        if cursor:
+            # Keyset mode: seek past the last row of the previous page
+            parsers = [(column.key, CURSOR_PARSERS[column.key]) for column in columns]
+            values = decode_keyset_cursor(cursor, parsers)
+            keyset = tuple_(*columns)
+            statement = statement.where(
+                keyset < values if descending else keyset > values
+            )
+        elif skip:
+            # Legacy offset mode
+            statement = statement.offset(skip)
+        return statement
+
+    async def getBooks(
+        self,
+        session: AsyncSession,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        fields: Sequence[str] = BOOK_FIELDS,
+        filters: Optional[BookFilters] = None,
+        sort: str = DEFAULT_SORT,
+    ) -> List[dict]:
+        """Page of books as dicts, reading only ``fields`` plus the key columns"""
+        keys = set(BOOK_KEY_FIELDS).union(self.sortColumns(sort))
+        columns = [
+            column
+            for field, column in zip(BOOK_FIELDS, BOOK_COLUMNS)
+            if field in fields or field in keys
+        ]
+        statement = self._pageStatement(
+            select(*columns), skip, limit, cursor, filters, sort
+        )
+        result = await session.exec(statement)
+        return [dict(row) for row in result.mappings()]
+
+    async def getBookVersions(
+        self,
+        session: AsyncSession,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        filters: Optional[BookFilters] = None,
+        sort: str = DEFAULT_SORT,
+    ) -> List[dict]:
+        """uid, updated_at and the sort columns of the page getBooks would return"""
+        names = ("uid", "updated_at") + self.sortColumns(sort)
+        columns = [getattr(Books, name) for name in dict.fromkeys(names)]
+        statement = self._pageStatement(
+            select(*columns), skip, limit, cursor, filters, sort
+        )
+        result = await session.exec(statement)
+        return [dict(row) for row in result.mappings()]
+
+    async def searchBooks(
+        self,
+        query: str,
+        session: AsyncSession,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ):
+        """Full-text search returning (book dict, rank) pairs, best match first"""
+        search_vector = Books.__table__.c.search_vector
+        ts_query = func.websearch_to_tsquery("english", query)
+        rank = func.ts_rank_cd(search_vector, ts_query)
         statement = (
-            select(Books).offset(skip).limit(limit).order_by(desc(Books.created_at))
+            select(*BOOK_COLUMNS, rank.label("rank"))
+            .where(search_vector.op("@@")(ts_query))
+            .order_by(desc(rank), desc(Books.uid))
+            .limit(limit)
         )
+        if cursor:
+            last_rank, last_uid = decode_rank_cursor(cursor)
+            statement = statement.where(tuple_(rank, Books.uid) < (last_rank, last_uid))
         result = await session.exec(statement)
-        return result.all()
+        return [
+            ({field: row[field] for field in BOOK_FIELDS}, row["rank"])
+            for row in result.mappings()
+        ]
 
-    async def getBook(self, book_uid: str, session: AsyncSession):
-        statement = select(Books).where(Books.uid == book_uid)
+    async def streamBooks(
+        self, session: AsyncSession, batch_size: int = 1000
+    ) -> AsyncIterator[dict]:
+        """Yield every book as a plain mapping through a server-side cursor"""
+        statement = (
+            select(*Books.__mapper__.columns)
+            .order_by(Books.created_at, Books.uid)
+            .execution_options(yield_per=batch_size)
+        )
+        result = await session.stream(statement)
+        async for row in result.mappings():
+            yield row
+
+    def _parseUids(self, book_uids: Sequence) -> List[Optional[uuid.UUID]]:
+        # Malformed uids match nothing rather than failing the whole batch
+        parsed = []
+        for book_uid in book_uids:
+            try:
+                parsed.append(uuid.UUID(str(book_uid)))
+            except ValueError:
+                parsed.append(None)
+        return parsed
+
+    async def _loadBooks(
+        self, book_uids: Sequence[uuid.UUID], session: AsyncSession
+    ) -> Dict[uuid.UUID, Books]:
+        """ORM instances for book_uids in one IN query, keyed by uid"""
+        wanted = {book_uid for book_uid in book_uids if book_uid is not None}
+        if not wanted:
+            return {}
+        statement = select(Books).where(Books.uid.in_(wanted))
         result = await session.exec(statement)
-        book = result.first()
+        return {book.uid: book for book in result.all()}
+
+    async def getBook(self, book_uid: str, session: AsyncSession):
+        (book_uid,) = self._parseUids([book_uid])
+        books = await self._loadBooks([book_uid], session)
+        return books.get(book_uid)
+
+    async def getBookRows(
+        self, book_uids: Sequence, session: AsyncSession
+    ) -> List[Optional[dict]]:
+        """Books' response fields as dicts in request order, None when missing"""
+        parsed = self._parseUids(book_uids)
+        wanted = {book_uid for book_uid in parsed if book_uid is not None}
+        found = {}
+        if wanted:
+            statement = select(*BOOK_COLUMNS).where(Books.uid.in_(wanted))
+            result = await session.exec(statement)
+            found = {row["uid"]: dict(row) for row in result.mappings()}
+        return [found.get(book_uid) for book_uid in parsed]
+
+    async def getBookRow(self, book_uid: str, session: AsyncSession):
+        """A book's response fields as a dict, without loading an ORM instance"""
+
+        async def load():
+            (book,) = await self.getBookRows([book_uid], session)
+            return book
+
+        book = await book_row_flight.do(self._itemKey(book_uid), load)
+        # Concurrent callers share the row, so each gets its own copy
+        return dict(book) if book else None
+
+    def bookDict(self, book: Books) -> dict:
+        return {field: getattr(book, field) for field in BOOK_FIELDS}
+
+    async def getBooksCached(self, session: AsyncSession, limit: int = 100):
+        """First page of getBooks, served from the cache when possible"""
+        if not self.cache:
+            return await self.getBooks(session, 0, limit)
+        # Read the generation first so a concurrent write orphans this entry
+        key = f"books:list:{await self._listGeneration()}:{limit}"
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return [self._fromCache(book) for book in cached]
+        books = await self.getBooks(session, 0, limit)
+        await self.cache.set(key, [self._cacheValue(book) for book in books])
+        return books
+
+    async def getBookCached(self, book_uid: str, session: AsyncSession):
+        """getBook, served from the cache when possible"""
+        if not self.cache:
+            return await self.getBookRow(book_uid, session)
+        # As with listings, a write during the read orphans the entry it sets
+        item_key = self._itemKey(book_uid)
+        generation = await self._itemGeneration(item_key)
+        key = f"{item_key}:{self.cacheEpoch}:{generation}"
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return self._fromCache(cached)
+        book = await self.getBookRow(book_uid, session)
+        if book:
+            await self.cache.set(key, self._cacheValue(book))
+        return book
 
-        return book if book else None
+    def _itemKey(self, book_uid) -> str:
+        # Normalise so "ABC..." and "abc..." share one entry
+        try:
+            return f"books:item:{uuid.UUID(str(book_uid))}"
+        except ValueError:
+            return f"books:item:{book_uid}"
+
+    def _cacheValue(self, book: dict) -> dict:
+        return {
+            **book,
+            "uid": str(book["uid"]),
+            "created_at": book["created_at"] and book["created_at"].isoformat(),
+            "updated_at": book["updated_at"] and book["updated_at"].isoformat(),
+        }
+
+    def _fromCache(self, value: dict) -> dict:
+        # Restore the types a database read returns, so ETags match
+        return {
+            **value,
+            "uid": uuid.UUID(value["uid"]),
+            "created_at": value["created_at"]
+            and datetime.fromisoformat(value["created_at"]),
+            "updated_at": value["updated_at"]
+            and datetime.fromisoformat(value["updated_at"]),
+        }
+
+    async def _listGeneration(self) -> str:
+        generation = await self.cache.get("books:list:generation")
+        if generation is None:
+            generation = await self._invalidateLists()
+        return generation
+
+    async def _invalidateLists(self) -> str:
+        """Orphan every cached listing by moving to a new generation"""
+        generation = uuid.uuid4().hex
+        await self.cache.set("books:list:generation", generation, ttl=24 * 60 * 60)
+        return generation
+
+    async def _itemGeneration(self, item_key: str) -> str:
+        generation = await self.cache.get(f"{item_key}:generation")
+        if generation is None:
+            generation = await self._invalidateItem(item_key)
+        return generation
+
+    async def _invalidateItem(self, item_key: str) -> str:
+        generation = uuid.uuid4().hex
+        await self.cache.set(f"{item_key}:generation", generation, ttl=24 * 60 * 60)
+        return generation
+
+    async def forgetChange(self, change: ChangeEvent) -> None:
+        """Drop what a change, possibly made by another worker, made stale.
+
+        A reset means changes were missed, so every cached book is orphaned.
+        """
+        if not self.cache:
+            return
+        if change.type == "reset":
+            self.cacheEpoch += 1
+            await self._invalidateLists()
+            return
+        book_uid = json.loads(change.data).get("uid")
+        await self._invalidateBooks([book_uid] if book_uid else [])
+
+    async def _invalidateBooks(self, book_uids: Iterable) -> None:
+        if self.cache:
+            for item_key in {self._itemKey(book_uid) for book_uid in book_uids}:
+                await self._invalidateItem(item_key)
+            await self._invalidateLists()
+
+    async def getBookVersion(self, book_uid: str, session: AsyncSession):
+        """(uid, updated_at) of a book without loading the row"""
+        (book_uid,) = self._parseUids([book_uid])
+        if book_uid is None:
+            return None
+        statement = select(Books.uid, Books.updated_at).where(Books.uid == book_uid)
+        result = await session.exec(statement)
+        return result.first()
 
     async def createBook(self, book_data: BookCreateModel, session: AsyncSession):
         book_data_dict = book_data.model_dump()
         new_book = Books(**book_data_dict)
         session.add(new_book)
+        await self.stats.applyDeltas(self.stats.deltas(added=[book_data_dict]), session)
+        if self.changes:
+            await session.flush()
+            await self.changes.stage(session, [("created", self.bookDict(new_book))])
         await session.commit()
+        if self.cache:
+            await self._invalidateLists()
         return new_book
 
+    async def importBooks(
+        self,
+        records: AsyncIterable[Tuple[int, object]],
+        session: AsyncSession,
+        batch_size: int = 1000,
+        max_errors: int = 1000,
+    ) -> BulkImportResponse:
+        """Validate (row, record) pairs one at a time and insert them in batches.
+
+        Invalid rows are reported and skipped. A batch the database rejects is
+        rolled back and reported row by row, and the import carries on.
+        """
+        report = BulkImportResponse()
+        batch: List[Tuple[int, dict]] = []
+
+        async for row, record in records:
+            if isinstance(record, ValueError):
+                self._reportRowError(report, row, [str(record)], max_errors)
+                continue
+            try:
+                book = BookCreateModel.model_validate(record)
+            except ValidationError as e:
+                errors = [
+                    f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}"
+                    for error in e.errors()
+                ]
+                self._reportRowError(report, row, errors, max_errors)
+                continue
+
+            batch.append((row, book.model_dump()))
+            if len(batch) >= batch_size:
+                await self._insertBatch(batch, session, report, max_errors)
+                batch = []
+
+        if batch:
+            await self._insertBatch(batch, session, report, max_errors)
+        return report
+
+    async def _insertBatch(
+        self,
+        batch: List[Tuple[int, dict]],
+        session: AsyncSession,
+        report: BulkImportResponse,
+        max_errors: int,
+    ):
+        now = datetime.now()
+        values = [
+            {**data, "uid": uuid.uuid4(), "created_at": now, "updated_at": now}
+            for _, data in batch
+        ]
+        try:
+            await session.exec(insert(Books), params=values)
+            await self.stats.applyDeltas(self.stats.deltas(added=values), session)
+            if self.changes:
+                # One event per batch rather than flooding subscribers
+                await self.changes.stage(session, [("imported", {"count": len(batch)})])
+            await session.commit()
+        except SQLAlchemyError as e:
+            await session.rollback()
+            reason = str(getattr(e, "orig", None) or e).splitlines()[0]
+            for row, _ in batch:
+                self._reportRowError(report, row, [reason], max_errors)
+            return
+        report.inserted += len(batch)
+        if self.cache:
+            await self._invalidateLists()
+
+    def _reportRowError(
+        self,
+        report: BulkImportResponse,
+        row: int,
+        errors: List[str],
+        max_errors: int,
+    ):
+        report.failed += 1
+        if len(report.errors) < max_errors:
+            report.errors.append(BulkRowError(row=row, errors=errors))
+        else:
+            report.errors_truncated = True
+
     async def updateBook(
         self, book_uid: str, book_data: BookUpdateModel, session: AsyncSession
-    ):
-        book_to_update = await self.getBook(book_uid, session)
-        if book_to_update:
-            update_data_dict = book_data.model_dump()
+    ) -> Optional[dict]:
+        (book,) = await self.updateBooks([(book_uid, book_data.model_dump())], session)
+        return book
 
-            for key, value in update_data_dict.items():
-                setattr(book_to_update, key, value)
+    async def updateBooks(
+        self, updates: Sequence[Tuple[object, dict]], session: AsyncSession
+    ) -> List[Optional[dict]]:
+        """Apply (uid, changes) pairs in one transaction.
 
-            await session.commit()
+        Each pair is one UPDATE ... RETURNING, with no read beforehand on
+        Postgres. Returns the updated books in request order, None for
+        unknown uids.
+        """
+        parsed = self._parseUids([book_uid for book_uid, _ in updates])
+        now = datetime.now()
+        results = []
+        deltas = Counter()
+        for book_uid, (_, changes) in zip(parsed, updates):
+            book = None
+            if book_uid is not None:
+                book, previous = await self._updateReturningPrevious(
+                    book_uid, {**changes, "updated_at": now}, session
+                )
+            if book:
+                deltas.update(self.stats.deltas(added=[book], removed=[previous]))
+            results.append(book)
 
-            return book_to_update
-        return "Book not found"
+        await self.stats.applyDeltas(deltas, session)
+
+        if self.changes:
+            await self.changes.stage(
+                session, [("updated", book) for book in results if book]
+            )
+        await session.commit()
+        updated = [book["uid"] for book in results if book]
+        if updated:
+            await self._invalidateBooks(updated)
+        return results
+
+    async def _updateReturningPrevious(
+        self, book_uid: uuid.UUID, values: dict, session: AsyncSession
+    ) -> Tuple[Optional[dict], Optional[dict]]:
+        """Update a book; the new row and its previous author and year"""
+        if session.bind.dialect.name != "postgresql":
+            # SQLite cannot return joined columns from UPDATE ... FROM
+            statement = select(Books.author, Books.year).where(Books.uid == book_uid)
+            previous = (await session.exec(statement)).mappings().first()
+            statement = (
+                update(Books)
+                .where(Books.uid == book_uid)
+                .values(**values)
+                .returning(*BOOK_COLUMNS)
+            )
+            row = (await session.exec(statement)).mappings().first()
+            return (dict(row), dict(previous)) if row else (None, None)
+
+        old = (
+            select(Books.uid, Books.author, Books.year)
+            .where(Books.uid == book_uid)
+            .with_for_update()
+            .subquery()
+        )
+        statement = (
+            update(Books)
+            .where(Books.uid == old.c.uid)
+            .values(**values)
+            .returning(
+                *BOOK_COLUMNS,
+                old.c.author.label("previous_author"),
+                old.c.year.label("previous_year"),
+            )
+        )
+        row = (await session.exec(statement)).mappings().first()
+        if not row:
+            return None, None
+        book = dict(row)
+        previous = {
+            "author": book.pop("previous_author"),
+            "year": book.pop("previous_year"),
+        }
+        return book, previous
 
     async def deleteBook(self, book_uid: str, session: AsyncSession):
-        book_to_delete = await self.getBook(book_uid, session)
-        if book_to_delete:
-            await session.delete(book_to_delete)
+        (deleted,) = await self.deleteBooks([book_uid], session)
+        return "Book deleted successfully" if deleted else None
+
+    async def deleteBooks(
+        self, book_uids: Sequence, session: AsyncSession
+    ) -> List[bool]:
+        """Delete books with one DELETE ... RETURNING; whether each existed, in order"""
+        parsed = self._parseUids(book_uids)
+        wanted = {book_uid for book_uid in parsed if book_uid is not None}
+        existing = set()
+        if wanted:
+            statement = (
+                delete(Books)
+                .where(Books.uid.in_(wanted))
+                .returning(Books.uid, Books.author, Books.year)
+            )
+            removed = (await session.exec(statement)).mappings().all()
+            existing = {book["uid"] for book in removed}
+            await self.stats.applyDeltas(self.stats.deltas(removed=removed), session)
+            if self.changes:
+                await self.changes.stage(
+                    session, [("deleted", {"uid": book_uid}) for book_uid in existing]
+                )
             await session.commit()
-            return "Book deleted successfully"
-        return "Book not found"
+        if existing:
+            await self._invalidateBooks(existing)
+        return [book_uid in existing for book_uid in parsed]
@@ -0,0 +1,114 @@
+"""Book counts per author and per year, kept in step with the books table.
+
+BookService applies the changes of every write in the write's own
+transaction. ``python -m src.books.stats`` rebuilds the counts from the books
+table, to repair them after writes made outside the service.
+"""
+
+import asyncio
+from collections import Counter
+from typing import Iterable, Mapping
+
+from sqlalchemy import String, cast, literal, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import delete, func, insert, select, tuple_
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.db.main import close_db, session_scope
+from .models import Books, BookStats
+
+DIMENSIONS = (("author", Books.author), ("year", cast(Books.year, String)))
+
+
+class BookStatsService:
+
+    def deltas(
+        self, added: Iterable[Mapping] = (), removed: Iterable[Mapping] = ()
+    ) -> Counter:
+        """Count changes per (dimension, value) for books with author and year"""
+        deltas = Counter()
+        for books, step in ((added, 1), (removed, -1)):
+            for book in books:
+                deltas["author", book["author"]] += step
+                deltas["year", str(book["year"])] += step
+        return deltas
+
+    async def applyDeltas(self, deltas: Counter, session: AsyncSession) -> None:
+        """Upsert the changes in one statement; groups that reach 0 are removed.
+
+        Rows are written in key order so concurrent writers cannot deadlock.
+        """
+        changes = sorted((key, step) for key, step in deltas.items() if step)
+        if not changes:
+            return
+        upsert = sqlite_insert if session.bind.dialect.name == "sqlite" else pg_insert
+        statement = upsert(BookStats).values(
+            [
+                {"dimension": dimension, "value": value, "book_count": step}
+                for (dimension, value), step in changes
+            ]
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=["dimension", "value"],
+            set_={"book_count": BookStats.book_count + statement.excluded.book_count},
+        )
+        await session.exec(statement)
+
+        emptied = [key for key, step in changes if step < 0]
+        if emptied:
+            await session.exec(
+                delete(BookStats).where(
+                    tuple_(BookStats.dimension, BookStats.value).in_(emptied),
+                    BookStats.book_count <= 0,
+                )
+            )
+
+    async def getStats(self, session: AsyncSession) -> dict:
+        """Totals read from the summary rows only, one per author and year"""
+        statement = select(BookStats.dimension, BookStats.value, BookStats.book_count)
+        rows = (await session.exec(statement)).all()
+        authors = [
+            {"author": value, "count": count}
+            for dimension, value, count in rows
+            if dimension == "author"
+        ]
+        years = [
+            {"year": int(value), "count": count}
+            for dimension, value, count in rows
+            if dimension == "year"
+        ]
+        authors.sort(key=lambda group: (-group["count"], group["author"]))
+        years.sort(key=lambda group: group["year"])
+        # Every book has exactly one year, so no separate (and hot) total row
+        total = sum(group["count"] for group in years)
+        return {"total": total, "authors": authors, "years": years}
+
+    async def rebuildStats(self, session: AsyncSession) -> int:
+        """Recount every group from the books table; returns the group count"""
+        if session.bind.dialect.name == "postgresql":
+            # Reads carry on; writes wait until the recount commits
+            await session.exec(text("LOCK TABLE books IN SHARE MODE"))
+        await session.exec(delete(BookStats))
+        for dimension, column in DIMENSIONS:
+            await session.exec(
+                insert(BookStats).from_select(
+                    ["dimension", "value", "book_count"],
+                    select(literal(dimension), column, func.count()).group_by(column),
+                )
+            )
+        groups = (await session.exec(select(func.count()).select_from(BookStats))).one()
+        await session.commit()
+        return groups
+
+
+async def rebuild() -> int:
+    try:
+        async with session_scope() as session:
+            return await BookStatsService().rebuildStats(session)
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    print(f"Rebuilt {asyncio.run(rebuild())} book stats groups")
@@ -0,0 +1,6 @@
+"""Imported first by the package, so the import phase of the startup
+report covers everything that follows it."""
+
+import time
+
+import_started = time.perf_counter()
@@ -1,13 +1,133 @@
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    # Optional read replica for read-only routes; reads use the primary if unset
+    DATABASE_REPLICA_URL: Optional[str] = None
     SECRET_KEY: str
     REFRESH_SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
     REFRESH_TOKEN_EXPIRE_DAYS: int
+    # Level of the app's own logs, printed alongside uvicorn's
+    LOG_LEVEL: str = "INFO"
+    # "create_all" creates missing tables on startup; "verify" only checks
+    # that the database is at the Alembic head revision, with one query
+    STARTUP_MODE: str = "create_all"
+    ALEMBIC_CONFIG: str = "alembic.ini"
+    # Connections per pool opened concurrently at startup
+    DB_POOL_WARMUP: int = 4
+    # python -m src.serve: worker processes (0 for one per CPU), the seconds
+    # a stopping worker gets to finish in-flight requests
+    WEB_HOST: str = "0.0.0.0"
+    WEB_PORT: int = 8000
+    WEB_WORKERS: int = 0
+    WEB_GRACEFUL_TIMEOUT: int = 30
+    # Connections all workers together may open to each database server; when
+    # set, every worker's pool is shrunk to its share. 0 leaves pools as is.
+    DB_MAX_CONNECTIONS: int = 0
+    # Engine and connection pool, applied to the primary and the replica
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # asyncpg prepared statements cached per connection; 0 for pgbouncer
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # Server-side statement_timeout in milliseconds; 0 disables it
+    DB_STATEMENT_TIMEOUT_MS: int = 0
+    # Trust signed access token claims instead of loading the user per request
+    AUTH_STATELESS: bool = True
+    # Password hashing pool: "thread" or "process"
+    HASH_EXECUTOR: str = "thread"
+    HASH_WORKERS: int = 4
+    HASH_MAX_QUEUE: int = 64
+    # Password hashing: "bcrypt" or "argon2" (needs argon2-cffi). At startup
+    # the cost is calibrated to the target latency on this host unless
+    # calibration is off, in which case bcrypt uses the fixed rounds.
+    PASSWORD_HASH_SCHEME: str = "bcrypt"
+    PASSWORD_HASH_TARGET_MS: float = 250
+    PASSWORD_HASH_CALIBRATE: bool = True
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    PASSWORD_ARGON2_MEMORY_KIB: int = 65536
+    PASSWORD_ARGON2_PARALLELISM: int = 2
+    # Re-hash outdated password hashes after a successful login
+    PASSWORD_REHASH_ON_LOGIN: bool = True
+    # Rows per INSERT batch and per-row errors kept for POST /books/bulk, and
+    # the longest line or CSV record (in characters) it buffers
+    BULK_IMPORT_BATCH_SIZE: int = 1000
+    BULK_IMPORT_MAX_ERRORS: int = 1000
+    BULK_IMPORT_MAX_LINE_LENGTH: int = 1024 * 1024
+    # Rows fetched per round trip by the server-side cursor behind exports
+    EXPORT_BATCH_SIZE: int = 1000
+    # Upper bound on uids or items in one /books batch request
+    BOOK_BATCH_MAX_ITEMS: int = 100
+    # Login throttling: token buckets per client IP and per username, and a
+    # cap on logins in progress. A rate or cap of 0 disables that limit.
+    LOGIN_IP_RATE_PER_MINUTE: float = 30
+    LOGIN_IP_BURST: int = 10
+    LOGIN_USERNAME_RATE_PER_MINUTE: float = 10
+    LOGIN_USERNAME_BURST: int = 5
+    LOGIN_MAX_CONCURRENT: int = 16
+    LOGIN_THROTTLE_MAX_KEYS: int = 100000
+    # Reads whose concurrent identical calls share one query
+    SINGLE_FLIGHT_METHODS: List[str] = [
+        "BookService.getBookRow",
+        "UserService.get_user_row",
+        "AuthUtil.get_user",
+    ]
+    # Book read cache: "memory" (per process), "redis", "local" or "none"
+    BOOK_CACHE_BACKEND: str = "memory"
+    BOOK_CACHE_URL: Optional[str] = None
+    BOOK_CACHE_TTL_SECONDS: float = 30
+    BOOK_CACHE_MAX_ENTRIES: int = 10000
+    # GET /books/changes: events kept for resuming, events a subscriber may
+    # fall behind before it is disconnected, and the idle keepalive interval.
+    # BOOK_CHANGES_NOTIFY fans events, token revocations and per-process
+    # cache invalidations out to every worker through Postgres LISTEN/NOTIFY;
+    # python -m src.serve turns it on when it starts several workers.
+    BOOK_CHANGES_BUFFER: int = 1000
+    BOOK_CHANGES_QUEUE_SIZE: int = 100
+    BOOK_CHANGES_MAX_SUBSCRIBERS: int = 10000
+    BOOK_CHANGES_KEEPALIVE_SECONDS: float = 15
+    BOOK_CHANGES_NOTIFY: bool = False
+    # gzip or zstd (needs zstandard) per Accept-Encoding; single-chunk bodies
+    # under the minimum are sent uncompressed
+    RESPONSE_COMPRESSION: bool = True
+    RESPONSE_COMPRESSION_MIN_BYTES: int = 1024
+    RESPONSE_GZIP_LEVEL: int = 6
+    RESPONSE_ZSTD_LEVEL: int = 3
+    # Admission control: concurrency cap, priority, queue budget and request
+    # deadline (applied as the DB statement timeout) per route class. Routes
+    # map "METHOD /path" or "METHOD /prefix/*" to a class; unmatched routes
+    # are "default" and "exempt" routes bypass admission
+    ADMISSION_CONTROL: bool = True
+    ADMISSION_MAX_CONCURRENT: int = 64
+    ADMISSION_CLASSES: Dict[str, Dict[str, float]] = {
+        "cheap": {"limit": 64, "priority": 2, "queue_ms": 1000, "deadline_ms": 2000},
+        "default": {"limit": 32, "priority": 1, "queue_ms": 500, "deadline_ms": 5000},
+        "expensive": {"limit": 8, "priority": 0, "queue_ms": 250, "deadline_ms": 10000},
+        "stream": {"limit": 4, "priority": 0, "queue_ms": 250, "deadline_ms": 0},
+    }
+    ADMISSION_ROUTES: Dict[str, str] = {
+        "GET /v1/auth/profile": "cheap",
+        "GET /v1/books/*": "cheap",
+        "GET /v1/books": "expensive",
+        "GET /v1/books/search": "expensive",
+        "POST /v1/auth/login": "expensive",
+        "POST /v1/users/": "expensive",
+        "GET /v1/users/": "expensive",
+        "GET /v1/books/export": "stream",
+        "GET /v1/users/export": "stream",
+        # Batches commit as they go, so a deadline would cut an import short
+        # and lose its per-row report
+        "POST /v1/books/bulk": "stream",
+        "GET /v1/books/changes": "exempt",
+        "GET /metrics": "exempt",
+    }
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -1,14 +1,103 @@
-from sqlmodel import SQLModel, create_engine
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Tuple
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
-from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from src.config import Config
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
-async_engine = AsyncEngine(
-    create_engine(
-        url=Config.DATABASE_URL,
-        echo=True,
-    )
+
+def pool_limits(
+    pool_size: int, max_overflow: int, budget: int, workers: int, reserved: int = 0
+) -> Tuple[int, int]:
+    """Shrink pool_size and max_overflow to one worker's share of ``budget``.
+
+    ``reserved`` connections per worker are held outside the pool and come
+    out of the share first. The ratio between the two is kept; each worker
+    keeps at least one pooled connection.
+    """
+    if not budget:
+        return pool_size, max_overflow
+    share = max(budget // max(workers, 1) - reserved, 1)
+    if pool_size + max_overflow <= share:
+        return pool_size, max_overflow
+    size = max(share * pool_size // (pool_size + max_overflow), 1)
+    return size, max(share - size, 0)
+
+
+def create_db_engine(url: str, reserved: int = 0) -> AsyncEngine:
+    """Build an AsyncEngine with the pool and driver settings from Config.
+
+    ``reserved`` is the number of connections per worker opened to the same
+    server outside this engine's pool.
+    """
+    options = {
+        "echo": Config.DB_ECHO,
+        "pool_pre_ping": Config.DB_POOL_PRE_PING,
+        "pool_recycle": Config.DB_POOL_RECYCLE,
+    }
+    if not url.startswith("sqlite"):
+        # src.serve sets WEB_WORKERS to the real count before starting workers
+        pool_size, max_overflow = pool_limits(
+            Config.DB_POOL_SIZE,
+            Config.DB_MAX_OVERFLOW,
+            Config.DB_MAX_CONNECTIONS,
+            Config.WEB_WORKERS or 1,
+            reserved,
+        )
+        options.update(
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=Config.DB_POOL_TIMEOUT,
+        )
+    if url.startswith("postgresql+asyncpg"):
+        server_settings = {}
+        if Config.DB_STATEMENT_TIMEOUT_MS:
+            server_settings["statement_timeout"] = str(Config.DB_STATEMENT_TIMEOUT_MS)
+        options["connect_args"] = {
+            "prepared_statement_cache_size": Config.DB_STATEMENT_CACHE_SIZE,
+            "server_settings": server_settings,
+        }
+    return create_async_engine(url, **options)
+
+
+# The change feed's LISTEN connection is held for good, so it gets its own
+# unpooled engine and its connection comes out of the primary's budget
+listen_engine = create_async_engine(Config.DATABASE_URL, poolclass=NullPool)
+async_engine = create_db_engine(
+    Config.DATABASE_URL, reserved=1 if Config.BOOK_CHANGES_NOTIFY else 0
+)
+# Read-only routes go to the replica pool when one is configured
+read_engine = (
+    create_db_engine(Config.DATABASE_REPLICA_URL)
+    if Config.DATABASE_REPLICA_URL
+    else async_engine
+)
+
+
+def _dispose_after_fork() -> None:
+    # A forked child must not reuse the parent's sockets: drop the inherited
+    # pool without closing its connections, which the parent still owns
+    for engine in {async_engine, read_engine}:
+        engine.sync_engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_dispose_after_fork)
+
+async_session_maker = sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+read_session_maker = sessionmaker(
+    bind=read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
 )
 
 
@@ -19,11 +108,68 @@ async def init_db():
         await conn.run_sync(SQLModel.metadata.create_all)
 
 
-async def get_session() -> AsyncSession:
-    Session = sessionmaker(
-        bind=async_engine,
-        class_=AsyncSession,
-        expire_on_commit=False,
+def alembic_head(config_path: str) -> str:
+    """Head revision of the migration scripts"""
+    # Only the verify startup mode needs alembic, so it is imported here
+    from alembic.config import Config as AlembicConfig
+    from alembic.script import ScriptDirectory
+
+    return ScriptDirectory.from_config(AlembicConfig(config_path)).get_current_head()
+
+
+async def verify_db(config_path: str) -> str:
+    """Check with one query that the database is at the Alembic head revision"""
+    expected = alembic_head(config_path)
+    async with async_engine.connect() as conn:
+        try:
+            result = await conn.execute(text("SELECT version_num FROM alembic_version"))
+            current = result.scalar()
+        except DBAPIError:
+            current = None
+    if current != expected:
+        raise RuntimeError(
+            f"Database schema is at revision {current}, expected {expected}; "
+            "run 'alembic upgrade head'"
+        )
+    return current
+
+
+async def warm_pool(size: int) -> None:
+    """Open ``size`` connections per pool concurrently, then return them"""
+    engines = (
+        [async_engine] if read_engine is async_engine else [async_engine, read_engine]
     )
+    connections = []
+    for engine in engines:
+        # Opening more than the pool keeps would only churn overflow connections
+        pool_size = getattr(engine.pool, "size", lambda: size)()
+        connections += [engine.connect() for _ in range(min(size, pool_size))]
+    try:
+        await asyncio.gather(*(conn.start() for conn in connections))
+    finally:
+        await asyncio.gather(*(conn.close() for conn in connections))
+
+
+async def close_db():
+    await async_engine.dispose()
+    if read_engine is not async_engine:
+        await read_engine.dispose()
+
+
+async def get_session() -> AsyncSession:
+    async with async_session_maker() as session:
+        yield session
+
+
+async def get_read_session() -> AsyncSession:
+    """Session on the read replica, for handlers that never write"""
+    async with read_session_maker() as session:
+        yield session
+
+
+@asynccontextmanager
+async def session_scope(read_only: bool = False) -> AsyncIterator[AsyncSession]:
+    """Session for work that outlives the request, such as streamed responses"""
+    Session = read_session_maker if read_only else async_session_maker
     async with Session() as session:
         yield session
@@ -1,6 +1,7 @@
 from fastapi import Request, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from .auth.util import AuthUtil
+from .config import Config
 from .db.main import get_session  # Import your session dependency
 
 auth_util = AuthUtil()
@@ -17,12 +18,17 @@ class AccessTokenBearer(HTTPBearer):
     ) -> HTTPAuthorizationCredentials | None:
         creds = await super().__call__(request)
 
-        if not self.token_valid:
+        if not creds:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid or expired access token",
             )
 
+        if Config.AUTH_STATELESS:
+            # Signed claims are trusted; revocation is checked in-process
+            # when the process can vouch for it, else against the database
+            return await auth_util.verify_access_claims(creds.credentials, session)
+
         user = await auth_util.verify_token(creds.credentials, session)
         return user
 
@@ -37,7 +43,7 @@ class RefreshTokenBearer(HTTPBearer):
         session=Depends(get_session),  # Add session as a dependency
     ) -> HTTPAuthorizationCredentials | None:
         creds = await super().__call__(request)
-        if not self.token_valid:
+        if not creds:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid or expired refresh token",
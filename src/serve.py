@@ -0,0 +1,76 @@
+"""Multi-worker entry point: python -m src.serve"""
+
+import logging
+import os
+
+import uvicorn
+
+from src.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def cpu_count() -> int:
+    """CPUs this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def worker_count(configured: int, cpus: int, db_budget: int) -> int:
+    """Workers to start: ``configured`` or one per CPU, within the DB budget"""
+    workers = configured or cpus
+    if db_budget and workers > db_budget:
+        # Every worker needs at least one connection of its own
+        logger.warning(
+            "%s workers exceed DB_MAX_CONNECTIONS=%s, starting %s",
+            workers,
+            db_budget,
+            db_budget,
+        )
+        workers = db_budget
+    return max(workers, 1)
+
+
+def shares_state(workers: int) -> bool:
+    """Whether workers can see each other's token revocations and writes.
+
+    Revocations, and invalidations of a per-process book cache, travel over
+    Postgres NOTIFY, so several workers need Postgres and
+    BOOK_CHANGES_NOTIFY, which is turned on here when it can be.
+    """
+    if workers == 1 or Config.BOOK_CHANGES_NOTIFY:
+        return True
+    if not Config.DATABASE_URL.startswith("postgresql"):
+        return False
+    logger.info("turning on BOOK_CHANGES_NOTIFY to share state between workers")
+    os.environ["BOOK_CHANGES_NOTIFY"] = "true"
+    return True
+
+
+def main() -> None:
+    workers = worker_count(Config.WEB_WORKERS, cpu_count(), Config.DB_MAX_CONNECTIONS)
+    if not shares_state(workers):
+        logger.warning(
+            "%s workers need a Postgres database to share token revocations "
+            "and cache invalidations, starting 1",
+            workers,
+        )
+        workers = 1
+    # Workers are started fresh (not forked) and read these settings
+    os.environ["WEB_WORKERS"] = str(workers)
+    logger.info("starting %s workers", workers)
+    # SIGHUP restarts workers one by one; SIGTERM drains all of them. Either
+    # way a worker gets WEB_GRACEFUL_TIMEOUT seconds to finish its requests
+    # before its lifespan closes the pool.
+    uvicorn.run(
+        "src:app",
+        host=Config.WEB_HOST,
+        port=Config.WEB_PORT,
+        workers=workers,
+        timeout_graceful_shutdown=Config.WEB_GRACEFUL_TIMEOUT,
+    )
+
+
+if __name__ == "__main__":
+    main()
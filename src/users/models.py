@@ -1,22 +1,28 @@
 import uuid
-from sqlmodel import SQLModel, Field, Column
+from sqlmodel import SQLModel, Field, Column, Index
 import sqlalchemy.dialects.postgresql as pg
 from datetime import datetime
+from typing import Optional
 
 
 class Users(SQLModel, table=True):
     __tablename__ = "users"
+    # Keyset pagination walks (created_at, uid) in descending order
+    __table_args__ = (Index("ix_users_created_at_uid", "created_at", "uid"),)
     uid: uuid.UUID = Field(
-        sa_column=Column(
-            pg.UUID, nullable=False, primary_key=True, default=uuid.uuid4()
-        )
+        sa_column=Column(pg.UUID, nullable=False, primary_key=True, default=uuid.uuid4)
     )
     username: str = Field(max_length=8, unique=True, nullable=False)
-    password_hash: str = Field(max_length=8, nullable=False, exclude=True, default="")
+    password_hash: str = Field(max_length=255, nullable=False, exclude=True, default="")
     email: str = Field(max_length=40, unique=True, nullable=False)
     isVerified: bool = Field(default=False, nullable=False)
     created_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now))
     updated_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now))
+    # When the user's tokens were last revoked; kept so a restarted process
+    # can still reject them
+    tokens_revoked_at: Optional[datetime] = Field(
+        default=None, sa_column=Column(pg.TIMESTAMP(timezone=True), nullable=True)
+    )
 
 
 def __repr__(self):
@@ -1,14 +1,34 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
+from fastapi import (
+    APIRouter,
+    HTTPException,
+    Query,
+    Request,
+    status,
+    Depends,
+)
+from fastapi.responses import StreamingResponse
+from typing import List, Literal, Optional
 import uuid
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from .service import UserService
+from .service import USER_FIELDS, UserConflictError, UserService
 from .schemas import UserCreate, UserUpdate, UserResponse
-from ..db.main import get_session
+from ..config import Config
+from ..db.main import get_read_session, get_session, session_scope
 from ..dependencies import AccessTokenBearer
+from ..util.conditional import (
+    has_conditional_headers,
+    is_not_modified,
+    make_etag,
+    not_modified,
+    set_validators,
+)
+from ..util.fields import parse_fields, project
+from ..util.pagination import encode_created_at_cursor, set_next_cursor
+from ..util.response import FastJSONResponse
+from ..util.stream import encode_csv, encode_ndjson
 
-user_router = APIRouter()
+user_router = APIRouter(default_response_class=FastJSONResponse)
 user_service = UserService()
 access_token_bearer = AccessTokenBearer()
 
@@ -20,31 +40,90 @@ async def create_user(
     session: AsyncSession = Depends(get_session),
 ):
     try:
-        return await user_service.create_user(user, session)
+        new_user = await user_service.create_user(user, session)
+    except UserConflictError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return FastJSONResponse(new_user, status_code=status.HTTP_201_CREATED)
 
 
 # Get all users
 @user_router.get("/", response_model=List[UserResponse])
 async def get_users(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
-    session: AsyncSession = Depends(get_session),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(
+        None, description="Comma-separated subset of fields, e.g. uid,username"
+    ),
+    session: AsyncSession = Depends(get_read_session),
     token: str = Depends(access_token_bearer),
 ):
-    return await user_service.get_users(session, skip, limit)
+    try:
+        selected = parse_fields(fields, USER_FIELDS)
+        users = await user_service.get_users(session, skip, limit, cursor, selected)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    response = FastJSONResponse(
+        users if selected == USER_FIELDS else project(users, selected)
+    )
+    if users and len(users) == limit:
+        set_next_cursor(request, response, encode_created_at_cursor(users[-1]))
+    return response
+
+
+# Export all users
+@user_router.get("/export")
+async def export_users(
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    token: str = Depends(access_token_bearer),
+):
+    async def body():
+        # The session must outlive the handler, so it is opened by the stream
+        async with session_scope(read_only=True) as session:
+            rows = user_service.stream_users(session, Config.EXPORT_BATCH_SIZE)
+            if export_format == "csv":
+                chunks = encode_csv(rows, list(UserResponse.model_fields))
+            else:
+                chunks = encode_ndjson(rows)
+            async for chunk in chunks:
+                yield chunk
+
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="users.{export_format}"'
+        },
+    )
 
 
 # Get user by ID
 @user_router.get("/{user_id}", response_model=UserResponse)
-async def get_user(user_id: uuid.UUID, session: AsyncSession = Depends(get_session)):
-    user = await user_service.get_user(user_id, session)
+async def get_user(
+    user_id: uuid.UUID,
+    request: Request,
+    session: AsyncSession = Depends(get_read_session),
+):
+    if has_conditional_headers(request):
+        # Answer revalidations from (uid, updated_at) alone when possible
+        version = await user_service.get_user_version(user_id, session)
+        if version:
+            etag, last_modified = make_etag([version]), version.updated_at
+            if is_not_modified(request, etag, last_modified):
+                return not_modified(etag, last_modified)
+    user = await user_service.get_user_row(user_id, session)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
-    return user
+    response = FastJSONResponse(user)
+    etag = make_etag([(user["uid"], user["updated_at"])])
+    set_validators(response, etag, user["updated_at"])
+    return response
 
 
 # Update user
@@ -55,7 +134,9 @@ async def update_user(
     session: AsyncSession = Depends(get_session),
 ):
     try:
-        return await user_service.update_user(user_id, user_update, session)
+        user = await user_service.update_user(user_id, user_update, session)
+    except UserConflictError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
     except ValueError as e:
         raise HTTPException(
             status_code=(
@@ -65,13 +146,15 @@ async def update_user(
             ),
             detail=str(e),
         )
+    return FastJSONResponse(user)
 
 
 # Delete user
 @user_router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(
     user_id: uuid.UUID,
-    session: AsyncSession = Depends(access_token_bearer),
+    session: AsyncSession = Depends(get_session),
+    token: str = Depends(access_token_bearer),
 ):
     try:
         await user_service.delete_user(user_id, session)
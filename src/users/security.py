@@ -1,14 +1,221 @@
-from passlib.context import CryptContext
+from functools import lru_cache
+import logging
+import math
+import time
 
-# Create a password context using bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"])
+from src.config import Config
+from src.util.executor import BoundedExecutor
+from src.util.metrics import observe_password_hash, registry
+
+logger = logging.getLogger(__name__)
+
+SCHEMES = ("bcrypt", "argon2")
+# Hashing parameters below these are never used, however fast the host
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 16
+ARGON2_MAX_TIME_COST = 10
+
+# bcrypt is deliberately slow, so it never runs on the event loop
+hash_executor = BoundedExecutor(
+    "password-hash",
+    kind=Config.HASH_EXECUTOR,
+    max_workers=Config.HASH_WORKERS,
+    max_queue=Config.HASH_MAX_QUEUE,
+)
+hash_executor_state = registry.gauge(
+    "password_hash_executor", "Password hashing executor state by stat"
+)
+password_hash_cost = registry.gauge(
+    "password_hash_cost", "Current password hashing parameters by name"
+)
+
+
+def _collect_executor_stats() -> None:
+    for stat, value in hash_executor.stats().items():
+        hash_executor_state.set(value, stat=stat)
+
+
+registry.add_collector(_collect_executor_stats)
+
+
+@lru_cache(maxsize=8)
+def _context(config: str):
+    # Contexts travel to process-pool workers as their config string. passlib
+    # is imported on first use to keep it off the startup path.
+    from passlib.context import CryptContext
+
+    return CryptContext.from_string(config)
+
+
+def _config_string(settings: dict) -> str:
+    """Render CryptContext settings in passlib's config-file format"""
+    lines = ["[passlib]"]
+    for key, value in settings.items():
+        if isinstance(value, (list, tuple)):
+            value = ", ".join(value)
+        lines.append(f"{key} = {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _hash(config: str, password: str) -> str:
+    return _context(config).hash(password)
+
+
+def _verify(config: str, password: str, hashed_password: str) -> bool:
+    return _context(config).verify(password, hashed_password)
+
+
+def _time_hash(config: str, samples: int = 3) -> float:
+    """Best-of-n seconds to hash with ``config``"""
+    context = _context(config)
+    best = math.inf
+    for _ in range(samples):
+        start = time.perf_counter()
+        context.hash("calibration-password")
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+class PasswordHasher:
+    """The one place passwords are hashed and verified.
+
+    Parameters are tuned to ``target_ms`` of hashing time on this host by
+    calibrate(). Hashes made with any other scheme or cost still verify, and
+    needs_rehash() reports them so callers can upgrade them on login.
+    """
+
+    def __init__(
+        self,
+        scheme: str = "bcrypt",
+        target_ms: float = 250,
+        bcrypt_rounds: int = 12,
+        argon2_memory_kib: int = 65536,
+        argon2_parallelism: int = 2,
+        argon2_time_cost: int = 3,
+    ):
+        if scheme not in SCHEMES:
+            raise ValueError(f"Unknown password hash scheme: {scheme}")
+        if scheme == "argon2":
+            try:
+                import argon2  # noqa: F401
+            except ImportError:
+                raise RuntimeError(
+                    "The argon2 password scheme requires 'pip install argon2-cffi'"
+                )
+        self.scheme = scheme
+        self.target_ms = target_ms
+        self.bcrypt_rounds = bcrypt_rounds
+        self.argon2_memory_kib = argon2_memory_kib
+        self.argon2_parallelism = argon2_parallelism
+        self.argon2_time_cost = argon2_time_cost
+        self._build()
+
+    def _build(self) -> None:
+        settings = {
+            "schemes": [self.scheme] + [s for s in SCHEMES if s != self.scheme],
+            "default": self.scheme,
+            "deprecated": "auto",
+            # Only cheaper hashes need updating, so hosts calibrated to
+            # different costs never rewrite each other's hashes back and
+            # forth. passlib caps the accepted cost at the default unless a
+            # maximum is given
+            "bcrypt__rounds": self.bcrypt_rounds,
+            "bcrypt__min_rounds": self.bcrypt_rounds,
+            "bcrypt__max_rounds": BCRYPT_MAX_ROUNDS,
+        }
+        if self.scheme == "argon2":
+            settings.update(
+                argon2__memory_cost=self.argon2_memory_kib,
+                argon2__parallelism=self.argon2_parallelism,
+                argon2__rounds=self.argon2_time_cost,
+                argon2__min_rounds=self.argon2_time_cost,
+                argon2__max_rounds=ARGON2_MAX_TIME_COST,
+            )
+        self.config = _config_string(settings)
+        for name, value in self.parameters().items():
+            password_hash_cost.set(value, parameter=name)
+
+    def parameters(self) -> dict:
+        if self.scheme == "argon2":
+            return {
+                "argon2_time_cost": self.argon2_time_cost,
+                "argon2_memory_kib": self.argon2_memory_kib,
+                "argon2_parallelism": self.argon2_parallelism,
+            }
+        return {"bcrypt_rounds": self.bcrypt_rounds}
+
+    async def calibrate(self) -> dict:
+        """Pick the cost whose hashing time is closest to, not above, target_ms.
+
+        Timing runs on the hashing executor so it reflects the workers that
+        will do the real work.
+        """
+        if self.scheme == "argon2":
+            self.argon2_time_cost = 1
+            self._build()
+            elapsed = await hash_executor.run(_time_hash, self.config)
+            steps = self.target_ms / 1000 / elapsed
+            self.argon2_time_cost = min(max(int(steps), 1), ARGON2_MAX_TIME_COST)
+        else:
+            self.bcrypt_rounds = BCRYPT_MIN_ROUNDS
+            self._build()
+            elapsed = await hash_executor.run(_time_hash, self.config)
+            # Every extra bcrypt round doubles the work
+            extra = math.floor(math.log2(max(self.target_ms / 1000 / elapsed, 1)))
+            self.bcrypt_rounds = min(BCRYPT_MIN_ROUNDS + extra, BCRYPT_MAX_ROUNDS)
+        self._build()
+        logger.info(
+            "password hashing calibrated to %sms: %s", self.target_ms, self.parameters()
+        )
+        return self.parameters()
+
+    def hash(self, password: str) -> str:
+        with observe_password_hash("hash"):
+            return _hash(self.config, password)
+
+    def verify(self, password: str, hashed_password: str) -> bool:
+        with observe_password_hash("verify"):
+            return _verify(self.config, password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """Whether a hash uses another scheme or a lower cost than the current one"""
+        return _context(self.config).needs_update(hashed_password)
+
+    async def hash_async(self, password: str) -> str:
+        with observe_password_hash("hash"):
+            return await hash_executor.run(_hash, self.config, password)
+
+    async def verify_async(self, password: str, hashed_password: str) -> bool:
+        with observe_password_hash("verify"):
+            return await hash_executor.run(
+                _verify, self.config, password, hashed_password
+            )
+
+
+password_hasher = PasswordHasher(
+    scheme=Config.PASSWORD_HASH_SCHEME,
+    target_ms=Config.PASSWORD_HASH_TARGET_MS,
+    bcrypt_rounds=Config.PASSWORD_BCRYPT_ROUNDS,
+    argon2_memory_kib=Config.PASSWORD_ARGON2_MEMORY_KIB,
+    argon2_parallelism=Config.PASSWORD_ARGON2_PARALLELISM,
+)
 
 
 def get_password_hash(password: str) -> str:
-    """Hash a password using bcrypt."""
-    return pwd_context.hash(password)
+    """Hash a password with the current scheme and cost."""
+    return password_hasher.hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hasher.verify(plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the hashing executor."""
+    return await password_hasher.hash_async(password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the hashing executor."""
+    return await password_hasher.verify_async(plain_password, hashed_password)
@@ -1,20 +1,80 @@
-from sqlmodel import select, desc
+from typing import AsyncIterator, List, Optional, Sequence
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import delete, desc, insert, select, tuple_, update
 from sqlmodel.ext.asyncio.session import AsyncSession
 from datetime import datetime, timezone, timedelta
+import time
 import uuid
 from .models import Users
-from .schemas import UserCreate, UserUpdate
-from .security import get_password_hash
+from .schemas import UserCreate, UserUpdate, UserResponse
+from .security import get_password_hash_async
+from src.auth.revocation import revocation_feed, revocation_store
+from src.config import Config
+from src.util.pagination import decode_created_at_cursor
+from src.util.singleflight import single_flight
+
+# Response fields double as the columns read for API responses
+USER_FIELDS = tuple(UserResponse.model_fields)
+USER_COLUMNS = tuple(getattr(Users, field) for field in USER_FIELDS)
+# Always read: they build the page cursor
+USER_KEY_FIELDS = ("uid", "created_at")
+
+user_row_flight = single_flight(
+    "UserService.get_user_row", Config.SINGLE_FLIGHT_METHODS
+)
+
+
+class UserConflictError(ValueError):
+    """A username or email is already taken"""
 
 
 class UserService:
-    async def get_users(self, session: AsyncSession, skip: int = 0, limit: int = 100):
+    async def get_users(
+        self,
+        session: AsyncSession,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        fields: Sequence[str] = USER_FIELDS,
+    ) -> List[dict]:
+        """Page of users as dicts, reading only ``fields`` plus the key columns"""
+        columns = [
+            column
+            for field, column in zip(USER_FIELDS, USER_COLUMNS)
+            if field in fields or field in USER_KEY_FIELDS
+        ]
         statement = (
-            select(Users).offset(skip).limit(limit).order_by(desc(Users.created_at))
+            select(*columns)
+            .order_by(desc(Users.created_at), desc(Users.uid))
+            .limit(limit)
         )
+        if cursor:
+            # Keyset mode: seek past the last row of the previous page
+            created_at, uid = decode_created_at_cursor(cursor)
+            statement = statement.where(
+                tuple_(Users.created_at, Users.uid) < (created_at, uid)
+            )
+        elif skip:
+            # Legacy offset mode
+            statement = statement.offset(skip)
 
         result = await session.exec(statement)
-        return result.all()
+        return [dict(row) for row in result.mappings()]
+
+    async def stream_users(
+        self, session: AsyncSession, batch_size: int = 1000
+    ) -> AsyncIterator[dict]:
+        """Yield every user, minus the password hash, through a server-side cursor"""
+        private = ("password_hash", "tokens_revoked_at")
+        columns = [c for c in Users.__table__.columns if c.name not in private]
+        statement = (
+            select(*columns)
+            .order_by(Users.created_at, Users.uid)
+            .execution_options(yield_per=batch_size)
+        )
+        result = await session.stream(statement)
+        async for row in result.mappings():
+            yield row
 
     async def get_user(self, user_id: uuid.UUID, session: AsyncSession):
         statement = select(Users).where(Users.uid == user_id)
@@ -22,72 +82,95 @@ class UserService:
         user = result.first()
         return user if user else None
 
-    async def create_user(self, user_data: UserCreate, session: AsyncSession):
-        # Check if username or email already exists
-        existing_user = await session.exec(
-            select(Users).where(
-                (Users.username == user_data.username)
-                | (Users.email == user_data.email)
-            )
-        )
+    async def get_user_row(self, user_id: uuid.UUID, session: AsyncSession):
+        """A user's response fields as a dict, without loading an ORM instance"""
 
-        user = existing_user.first()
+        async def load():
+            statement = select(*USER_COLUMNS).where(Users.uid == user_id)
+            result = await session.exec(statement)
+            return result.mappings().first()
 
-        if user:
-            raise ValueError("Username or email already registered")
+        row = await user_row_flight.do(user_id, load)
+        return dict(row) if row else None
+
+    async def get_user_version(self, user_id: uuid.UUID, session: AsyncSession):
+        """(uid, updated_at) of a user without loading the row"""
+        statement = select(Users.uid, Users.updated_at).where(Users.uid == user_id)
+        result = await session.exec(statement)
+        return result.first()
 
-        # Create new user
-        user_data_dict = user_data.model_dump()
+    async def create_user(self, user_data: UserCreate, session: AsyncSession) -> dict:
+        """Insert a user in one round trip; the unique constraints catch duplicates"""
         # Define UTC+7 timezone
         utc_plus_7 = timezone(timedelta(hours=7))
-        user_data_dict["created_at"] = datetime.now(utc_plus_7)
-        user_data_dict["updated_at"] = datetime.now(utc_plus_7)
-        user_data_dict["password_hash"] = get_password_hash(user_data.password)
-        new_user = Users(**user_data_dict)
-
-        session.add(new_user)
-        await session.commit()
-        await session.refresh(new_user)
+        now = datetime.now(utc_plus_7)
+        values = {
+            **user_data.model_dump(exclude={"password"}),
+            "uid": uuid.uuid4(),
+            "isVerified": False,
+            "created_at": now,
+            "updated_at": now,
+            "password_hash": await get_password_hash_async(user_data.password),
+        }
+        statement = insert(Users).values(**values).returning(*USER_COLUMNS)
+        try:
+            result = await session.exec(statement)
+            new_user = dict(result.mappings().one())
+            await session.commit()
+        except IntegrityError:
+            await session.rollback()
+            raise UserConflictError("Username or email already registered")
         return new_user
 
     async def update_user(
         self, user_id: uuid.UUID, user_data: UserUpdate, session: AsyncSession
-    ):
-        user_to_update = await self.get_user(user_id, session)
-        if not user_to_update:
+    ) -> dict:
+        """UPDATE ... RETURNING; the unique constraints catch taken names"""
+        changes = user_data.model_dump(exclude_unset=True, exclude_none=True)
+        # Tokens carry the old profile claims, so they must be reissued
+        revoked_at = time.time()
+        statement = (
+            update(Users)
+            .where(Users.uid == user_id)
+            .values(
+                **changes,
+                updated_at=datetime.now(),
+                tokens_revoked_at=datetime.fromtimestamp(revoked_at, timezone.utc),
+            )
+            .returning(*USER_COLUMNS)
+        )
+        try:
+            result = await session.exec(statement)
+            row = result.mappings().first()
+            if row is not None:
+                await self._stage_revocation(user_id, revoked_at, session)
+            await session.commit()
+        except IntegrityError:
+            await session.rollback()
+            raise UserConflictError("Username or email already taken")
+        if row is None:
             raise ValueError("User not found")
-
-        # Check if new username or email conflicts with existing users
-        if (
-            user_data.username != user_to_update.username
-            or user_data.email != user_to_update.email
-        ):
-            existing_user = await session.exec(
-                select(Users).where(
-                    (Users.username == user_data.username)
-                    | (Users.email == user_data.email)
-                )
-            ).first()
-
-            if existing_user and existing_user.uid != user_id:
-                raise ValueError("Username or email already taken")
-
-        # Update user fields
-        update_data_dict = user_data.model_dump(exclude_unset=True)
-        for key, value in update_data_dict.items():
-            setattr(user_to_update, key, value)
-
-        user_to_update.updated_at = datetime.now()
-        session.add(user_to_update)
-        await session.commit()
-        await session.refresh(user_to_update)
-        return user_to_update
+        revocation_store.revoke_user(user_id, revoked_at)
+        return dict(row)
 
     async def delete_user(self, user_id: uuid.UUID, session: AsyncSession):
-        user_to_delete = await self.get_user(user_id, session)
-        if not user_to_delete:
+        statement = delete(Users).where(Users.uid == user_id).returning(Users.uid)
+        result = await session.exec(statement)
+        deleted = result.first()
+        if deleted is None:
+            await session.commit()
             raise ValueError("User not found")
-
-        await session.delete(user_to_delete)
+        # The row is gone, so database checks reject its tokens from now on
+        revoked_at = time.time()
+        await self._stage_revocation(user_id, revoked_at, session)
         await session.commit()
+        revocation_store.revoke_user(user_id, revoked_at)
         return True
+
+    async def _stage_revocation(
+        self, user_id: uuid.UUID, revoked_at: float, session: AsyncSession
+    ) -> None:
+        """Revoke the user's tokens in every worker once the session commits"""
+        await revocation_feed.stage(
+            session, [("revoked", {"uid": str(user_id), "revoked_at": revoked_at})]
+        )
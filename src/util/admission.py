@@ -0,0 +1,296 @@
+import asyncio
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import math
+import time
+from typing import Deque, Dict, Mapping, Optional
+
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from starlette.responses import JSONResponse
+
+from .metrics import registry
+
+admission_requests = registry.counter(
+    "admission_requests_total",
+    "Requests by route class and outcome: admitted, queued, shed or timed_out",
+)
+admission_in_flight = registry.gauge(
+    "admission_in_flight", "Admitted requests in progress by route class"
+)
+admission_queue_seconds = registry.histogram(
+    "admission_queue_seconds", "Time admitted requests waited for a slot"
+)
+
+# Monotonic time by which the current request should be done, if any
+request_deadline: ContextVar[Optional[float]] = ContextVar(
+    "request_deadline", default=None
+)
+
+# Postgres SQLSTATE for a statement cancelled by statement_timeout
+QUERY_CANCELED = "57014"
+
+
+class DeadlineExceededError(RuntimeError):
+    """Raised when a request's deadline passes before it starts DB work"""
+
+
+class OverloadedError(Exception):
+    """Raised when a request is shed; retry_after is in seconds"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Server is overloaded, please retry")
+        self.retry_after = retry_after
+
+
+@dataclass
+class RouteClass:
+    """Admission settings and live state shared by a group of routes"""
+
+    name: str
+    # Requests of this class in progress at once; 0 means unlimited
+    limit: int = 0
+    # Higher is admitted first when requests wait for a slot
+    priority: int = 0
+    # Longest a request may wait for a slot before it is shed
+    queue_ms: float = 1000
+    # Time allowed per request, applied to its DB statements; 0 for none
+    deadline_ms: float = 0
+    in_flight: int = 0
+    waiters: Deque[asyncio.Future] = field(default_factory=deque)
+    # Moving average of seconds a request holds its slot
+    service_seconds: float = 0.05
+
+
+class AdmissionController:
+    """Per-class and global concurrency caps with priority queueing.
+
+    A request that cannot start waits in its class's queue. Freed slots go to
+    the highest-priority class with waiters that is under its own cap. A
+    request is shed at once when the estimated wait already exceeds its
+    class's queue budget, and otherwise when the budget runs out.
+    """
+
+    def __init__(self, classes: Mapping[str, RouteClass], max_concurrent: int = 0):
+        self.classes = dict(classes)
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        # Classes in the order freed slots are offered to them
+        self._by_priority = sorted(
+            self.classes.values(), key=lambda route_class: -route_class.priority
+        )
+        registry.add_collector(self._collect)
+
+    def _collect(self) -> None:
+        for route_class in self.classes.values():
+            admission_in_flight.set(route_class.in_flight, route_class=route_class.name)
+
+    def _has_room(self, route_class: RouteClass) -> bool:
+        return (
+            not route_class.limit or route_class.in_flight < route_class.limit
+        ) and (not self.max_concurrent or self.in_flight < self.max_concurrent)
+
+    def _take(self, route_class: RouteClass) -> None:
+        route_class.in_flight += 1
+        self.in_flight += 1
+
+    def estimated_wait(self, route_class: RouteClass) -> float:
+        """Seconds until a new waiter of ``route_class`` would likely start"""
+        ahead = len(route_class.waiters) + 1
+        slots = route_class.limit or self.max_concurrent or 1
+        return ahead * route_class.service_seconds / slots
+
+    async def acquire(self, route_class: RouteClass) -> None:
+        """Take a slot for ``route_class``, raising OverloadedError to shed"""
+        if self._has_room(route_class) and not self._waiting_before(route_class):
+            self._take(route_class)
+            admission_requests.inc(route_class=route_class.name, outcome="admitted")
+            return
+
+        budget = route_class.queue_ms / 1000
+        estimate = self.estimated_wait(route_class)
+        if estimate > budget:
+            admission_requests.inc(route_class=route_class.name, outcome="shed")
+            raise OverloadedError(estimate)
+
+        waiter = asyncio.get_running_loop().create_future()
+        route_class.waiters.append(waiter)
+        admission_requests.inc(route_class=route_class.name, outcome="queued")
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), budget)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                waiter.cancel()
+                admission_requests.inc(
+                    route_class=route_class.name, outcome="timed_out"
+                )
+                raise OverloadedError(self.estimated_wait(route_class))
+        except asyncio.CancelledError:
+            # The client went away; pass on a slot granted in the meantime
+            if waiter.done() and not waiter.cancelled():
+                self.release(route_class)
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            if waiter in route_class.waiters:
+                route_class.waiters.remove(waiter)
+        admission_queue_seconds.observe(
+            time.monotonic() - start, route_class=route_class.name
+        )
+
+    def _waiting_before(self, route_class: RouteClass) -> bool:
+        # Newcomers must not overtake queued requests of equal or higher priority
+        return any(
+            other.waiters and other.priority >= route_class.priority
+            for other in self._by_priority
+        )
+
+    def release(self, route_class: RouteClass, held_seconds: float = 0) -> None:
+        route_class.in_flight -= 1
+        self.in_flight -= 1
+        if held_seconds:
+            route_class.service_seconds += 0.1 * (
+                held_seconds - route_class.service_seconds
+            )
+        self._wake()
+
+    def _wake(self) -> None:
+        for route_class in self._by_priority:
+            while route_class.waiters and self._has_room(route_class):
+                waiter = route_class.waiters.popleft()
+                if waiter.done():
+                    continue
+                # The slot is taken for the waiter before it resumes
+                self._take(route_class)
+                waiter.set_result(None)
+                admission_requests.inc(route_class=route_class.name, outcome="admitted")
+            if self.max_concurrent and self.in_flight >= self.max_concurrent:
+                return
+
+
+def _match(rules: Mapping[str, str], method: str, path: str) -> Optional[str]:
+    """Class for the most specific "METHOD /path" or "METHOD /prefix/*" rule"""
+    for key in (f"{method} {path}", f"* {path}"):
+        if key in rules:
+            return rules[key]
+    best, best_length = None, -1
+    for key, name in rules.items():
+        rule_method, _, pattern = key.partition(" ")
+        if not pattern.endswith("/*") or rule_method not in (method, "*"):
+            continue
+        prefix = pattern[:-1]
+        if path.startswith(prefix) and len(prefix) > best_length:
+            best, best_length = name, len(prefix)
+    return best
+
+
+class AdmissionMiddleware:
+    """ASGI middleware admitting requests through an AdmissionController.
+
+    ``routes`` maps "METHOD /path" or "METHOD /prefix/*" ("*" for any
+    method) to a class name; other requests use ``default_class``. Requests
+    mapped to "exempt", such as long-lived event streams, bypass admission.
+    Shed requests and requests whose deadline cancels a statement get 503
+    with Retry-After.
+    """
+
+    def __init__(
+        self,
+        app,
+        controller: AdmissionController,
+        routes: Mapping[str, str],
+        default_class: str = "default",
+    ):
+        self.app = app
+        self.controller = controller
+        self.routes = dict(routes)
+        self.default_class = default_class
+
+    def route_class(self, method: str, path: str) -> Optional[RouteClass]:
+        """None for exempt requests, or ones whose class is not configured"""
+        name = _match(self.routes, method, path) or self.default_class
+        return self.controller.classes.get(name)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        route_class = self.route_class(scope["method"], scope["path"])
+        if route_class is None:
+            return await self.app(scope, receive, send)
+
+        try:
+            await self.controller.acquire(route_class)
+        except OverloadedError as e:
+            return await _unavailable(e.retry_after)(scope, receive, send)
+
+        started = time.monotonic()
+        token = request_deadline.set(
+            started + route_class.deadline_ms / 1000
+            if route_class.deadline_ms
+            else None
+        )
+        response_started = False
+
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except (DeadlineExceededError, DBAPIError) as e:
+            if response_started or not _is_deadline_error(e):
+                raise
+            await _unavailable(1)(scope, receive, send)
+        finally:
+            request_deadline.reset(token)
+            self.controller.release(route_class, time.monotonic() - started)
+
+
+def _is_deadline_error(error: Exception) -> bool:
+    if isinstance(error, DeadlineExceededError):
+        return True
+    return getattr(error.orig, "sqlstate", None) == QUERY_CANCELED
+
+
+def _unavailable(retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"detail": "Server is overloaded, please retry"},
+        status_code=503,
+        headers={"Retry-After": str(max(math.ceil(retry_after), 1))},
+    )
+
+
+def _apply_deadline(session: Session, transaction, connection) -> None:
+    deadline = request_deadline.get()
+    if deadline is None or connection.dialect.name != "postgresql":
+        return
+    remaining_ms = int((deadline - time.monotonic()) * 1000)
+    if remaining_ms <= 0:
+        raise DeadlineExceededError("Request deadline passed before the query")
+    # Scoped to this transaction, so pooled connections keep their default
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {remaining_ms}")
+
+
+def install_statement_deadlines() -> None:
+    """Bound every session transaction's statements by the request deadline"""
+    if not event.contains(Session, "after_begin", _apply_deadline):
+        event.listen(Session, "after_begin", _apply_deadline)
+
+
+def build_classes(settings: Mapping[str, Mapping[str, float]]) -> Dict[str, RouteClass]:
+    return {
+        name: RouteClass(
+            name,
+            limit=int(options.get("limit", 0)),
+            priority=int(options.get("priority", 0)),
+            queue_ms=options.get("queue_ms", 1000),
+            deadline_ms=options.get("deadline_ms", 0),
+        )
+        for name, options in settings.items()
+    }
@@ -0,0 +1,155 @@
+from collections import OrderedDict
+import json
+import time
+from typing import Any, Optional
+
+
+class CacheBackend:
+    """Interface shared by the response cache stores.
+
+    Values must be JSON-compatible so that every backend can hold them.
+    ``shared`` backends are seen by every worker; the others are per process
+    and need every worker told about invalidations.
+    """
+
+    shared = False
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def _record(self, value: Optional[Any]) -> Optional[Any]:
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class InMemoryCache(CacheBackend):
+    """Per-process cache with a TTL per entry and LRU eviction"""
+
+    def __init__(self, max_entries: int = 10000, default_ttl: float = 30):
+        super().__init__()
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return self._record(None)
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return self._record(None)
+        self._entries.move_to_end(key)
+        return self._record(value)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (ttl or self.default_ttl)
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "entries": len(self._entries)}
+
+
+class KeyValueCache(CacheBackend):
+    """Cache stored in an external key-value service.
+
+    ``client`` follows the redis.asyncio interface: ``get``, ``set`` with an
+    ``ex`` expiry in seconds, and ``delete``. Eviction is left to the service.
+    """
+
+    def __init__(
+        self,
+        client,
+        default_ttl: float = 30,
+        prefix: str = "cache:",
+        shared: bool = True,
+    ):
+        super().__init__()
+        self.client = client
+        self.shared = shared
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self.client.get(self.prefix + key)
+        return self._record(None if raw is None else json.loads(raw))
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expiry = max(int(ttl or self.default_ttl), 1)
+        await self.client.set(self.prefix + key, json.dumps(value), ex=expiry)
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(self.prefix + key)
+
+
+class LocalKeyValueClient:
+    """In-memory stand-in for a redis.asyncio client, for tests and local runs"""
+
+    def __init__(self):
+        self._data: dict[str, tuple[Optional[float], str]] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: str, ex: Optional[int] = None) -> None:
+        expires_at = time.monotonic() + ex if ex else None
+        self._data[key] = (expires_at, value)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+
+
+def create_cache(
+    backend: str,
+    url: Optional[str] = None,
+    max_entries: int = 10000,
+    ttl: float = 30,
+) -> Optional[CacheBackend]:
+    """Build the cache named by ``backend``: memory, redis, local or none"""
+    if backend == "none":
+        return None
+    if backend == "memory":
+        return InMemoryCache(max_entries=max_entries, default_ttl=ttl)
+    if backend == "local":
+        return KeyValueCache(LocalKeyValueClient(), default_ttl=ttl, shared=False)
+    if backend == "redis":
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("The redis cache backend requires 'pip install redis'")
+        if not url:
+            raise ValueError("The redis cache backend requires a cache URL")
+        return KeyValueCache(redis.from_url(url), default_ttl=ttl)
+    raise ValueError(f"Unknown cache backend: {backend}")
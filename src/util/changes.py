@@ -0,0 +1,279 @@
+import asyncio
+from collections import deque
+import json
+import logging
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+import uuid
+
+from sqlalchemy import ARRAY, Text, bindparam, event, text
+from sqlalchemy.orm import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .metrics import registry
+from .response import dumps
+
+logger = logging.getLogger(__name__)
+
+change_feed_events = registry.counter(
+    "change_feed_events_total",
+    "Change feed events by feed and outcome: published, delivered or dropped",
+)
+change_feed_subscribers = registry.gauge(
+    "change_feed_subscribers", "Connected change feed subscribers by feed"
+)
+
+# NOTIFY payloads are limited to 8000 bytes; larger events only carry keys
+MAX_NOTIFY_PAYLOAD = 7500
+KEY_FIELDS = ("uid", "updated_at")
+_PENDING = "change_feed_pending"
+
+
+class ChangeEvent(NamedTuple):
+    id: str
+    type: str
+    # Encoded once on publish and shared by every subscriber
+    data: str
+
+
+class Subscription:
+    """One subscriber's bounded queue of events.
+
+    A subscriber that falls ``queue_size`` events behind is detached rather
+    than slowing the feed down; its stream ends once the queue is drained,
+    and it resumes from the ring buffer by reconnecting with its last id.
+    """
+
+    def __init__(self, feed: "ChangeFeed", backlog: Iterable[ChangeEvent]):
+        self.feed = feed
+        self.backlog: Deque[ChangeEvent] = deque(backlog)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=feed.queue_size)
+        self.detached = False
+
+    def offer(self, change: ChangeEvent) -> bool:
+        try:
+            self.queue.put_nowait(change)
+            return True
+        except asyncio.QueueFull:
+            self.detached = True
+            return False
+
+    @property
+    def finished(self) -> bool:
+        """Whether a detached subscriber has received everything it had queued"""
+        return self.detached and not self.backlog and self.queue.empty()
+
+    async def next(self, timeout: float) -> Optional[ChangeEvent]:
+        """The next event, or None after ``timeout`` idle seconds"""
+        if self.backlog:
+            return self.backlog.popleft()
+        if self.finished:
+            return None
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.feed.unsubscribe(self)
+
+
+class ChangeFeed:
+    """Fans out change events to subscribers, with a ring buffer for resuming.
+
+    Events are staged on the writing session and published only if its
+    transaction commits. Without ``notify`` they are dispatched in this
+    process. With it, they are sent with Postgres NOTIFY in the same
+    transaction and every worker dispatches what its FeedListener
+    receives, so all workers see all events in the same (commit) order.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        buffer_size: int = 1000,
+        queue_size: int = 100,
+        max_subscribers: int = 10000,
+        notify: bool = False,
+    ):
+        self.name = name
+        self.buffer: Deque[ChangeEvent] = deque(maxlen=buffer_size)
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.notify = notify
+        self.subscribers: Set[Subscription] = set()
+        self.observers: List[Callable[[ChangeEvent], None]] = []
+        registry.add_collector(self._collect)
+
+    def _collect(self) -> None:
+        change_feed_subscribers.set(len(self.subscribers), feed=self.name)
+
+    def full(self) -> bool:
+        return len(self.subscribers) >= self.max_subscribers
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Subscription:
+        """Subscribe, replaying buffered events after ``last_event_id``.
+
+        If that id is no longer buffered, the subscriber gets a single
+        "reset" event and should reload its state.
+        """
+        backlog: List[ChangeEvent] = []
+        if last_event_id:
+            ids = [change.id for change in self.buffer]
+            if last_event_id in ids:
+                start = ids.index(last_event_id) + 1
+                backlog = list(self.buffer)[start:]
+            else:
+                backlog = [self._reset_event()]
+        subscription = Subscription(self, backlog)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscribers.discard(subscription)
+
+    def observe(self, callback: Callable[[ChangeEvent], None]) -> None:
+        """Call ``callback`` with every event this process publishes.
+
+        Observers run synchronously and never fall behind, so they suit
+        per-process state, such as caches, that every worker must update.
+        """
+        self.observers.append(callback)
+
+    async def stage(
+        self, session: AsyncSession, changes: Iterable[Tuple[str, Any]]
+    ) -> None:
+        """Publish (type, data) pairs when the session's transaction commits"""
+        events = [
+            ChangeEvent(uuid.uuid4().hex, change_type, dumps(data).decode())
+            for change_type, data in changes
+        ]
+        if not events:
+            return
+        if self.notify:
+            payloads = [self._payload(change) for change in events]
+            statement = text(
+                "SELECT pg_notify(:channel, payload) FROM unnest(:payloads) AS payload"
+            ).bindparams(bindparam("payloads", type_=ARRAY(Text)))
+            await session.exec(
+                statement, params={"channel": self.name, "payloads": payloads}
+            )
+        else:
+            pending = session.sync_session.info.setdefault(_PENDING, [])
+            pending.extend((self, change) for change in events)
+
+    def _payload(self, change: ChangeEvent) -> str:
+        payload = dumps(change._asdict()).decode()
+        if len(payload.encode()) <= MAX_NOTIFY_PAYLOAD:
+            return payload
+        data = json.loads(change.data)
+        keys = {field: data[field] for field in KEY_FIELDS if field in data}
+        return dumps(change._replace(data=dumps(keys).decode())._asdict()).decode()
+
+    def publish(self, change: ChangeEvent) -> None:
+        """Buffer an event and offer it to every subscriber"""
+        self.buffer.append(change)
+        change_feed_events.inc(feed=self.name, outcome="published")
+        for callback in self.observers:
+            try:
+                callback(change)
+            except Exception:
+                logger.exception("%s observer failed", self.name)
+        for subscription in list(self.subscribers):
+            if subscription.offer(change):
+                change_feed_events.inc(feed=self.name, outcome="delivered")
+            else:
+                change_feed_events.inc(feed=self.name, outcome="dropped")
+                self.unsubscribe(subscription)
+
+    def reset(self) -> None:
+        """Forget buffered events and tell subscribers to reload"""
+        self.buffer.clear()
+        self.publish(self._reset_event())
+        self.buffer.clear()
+
+    def _reset_event(self) -> ChangeEvent:
+        return ChangeEvent("", "reset", "{}")
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        try:
+            self.publish(ChangeEvent(**json.loads(payload)))
+        except (TypeError, ValueError):
+            logger.warning("ignoring malformed %s notification", self.name)
+
+
+class FeedListener:
+    """LISTENs for the notify-mode feeds over one dedicated connection.
+
+    Notifications sent while the connection is down are lost, so every feed
+    is reset when the connection drops and again once it is listening.
+    """
+
+    def __init__(self, feeds: Iterable[ChangeFeed]):
+        self.feeds = [feed for feed in feeds if feed.notify]
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, engine) -> None:
+        if self.feeds and self._task is None:
+            self._task = asyncio.create_task(self._listen(engine))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen(self, engine) -> None:
+        names = ", ".join(feed.name for feed in self.feeds)
+        while True:
+            try:
+                async with engine.connect() as conn:
+                    raw = (await conn.get_raw_connection()).driver_connection
+                    closed = asyncio.Event()
+                    raw.add_termination_listener(lambda _: closed.set())
+                    for feed in self.feeds:
+                        await raw.add_listener(feed.name, feed._on_notify)
+                    logger.info("listening for %s notifications", names)
+                    # Cover what was sent before the listeners were in place
+                    for feed in self.feeds:
+                        feed.reset()
+                    try:
+                        await closed.wait()
+                    finally:
+                        # Leave the connection clean in case the engine pools it
+                        if not raw.is_closed():
+                            for feed in self.feeds:
+                                await raw.remove_listener(feed.name, feed._on_notify)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("listener for %s failed", names)
+            for feed in self.feeds:
+                feed.reset()
+            await asyncio.sleep(1)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session) -> None:
+    for feed, change in session.info.pop(_PENDING, []):
+        feed.publish(change)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session: Session, previous_transaction) -> None:
+    session.info.pop(_PENDING, None)
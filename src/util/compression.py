@@ -0,0 +1,162 @@
+from typing import Optional, Sequence
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from .metrics import registry
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+compressed_bytes = registry.counter(
+    "response_compression_bytes_total",
+    "Compressed response bytes by encoding and stage: in (raw) or out (sent)",
+)
+
+# Most preferred first; zstd only when the zstandard package is installed
+ENCODINGS = ("zstd", "gzip") if zstandard is not None else ("gzip",)
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/msgpack",
+    "application/x-ndjson",
+    "text/csv",
+    "text/plain",
+    "text/html",
+)
+
+
+def choose_encoding(
+    accept_encoding: Optional[str], available: Sequence[str] = ENCODINGS
+) -> Optional[str]:
+    """Best of ``available`` for an Accept-Encoding header, None for identity.
+
+    Ties in quality go to the server's preference order.
+    """
+    if not accept_encoding:
+        return None
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, *params = item.strip().lower().split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        qualities[coding.strip()] = quality
+    best, best_quality = None, 0.0
+    for coding in available:
+        quality = qualities.get(coding, qualities.get("*", 0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class _Compressor:
+    """Streaming compressor; every chunk is flushed so streams stay live"""
+
+    def __init__(self, encoding: str, gzip_level: int, zstd_level: int):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=zstd_level).compressobj()
+            self._flush_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            # wbits=31 writes the gzip header and trailer
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+            self._flush_mode = zlib.Z_SYNC_FLUSH
+
+    def compress(self, chunk: bytes, last: bool) -> bytes:
+        data = self._compressor.compress(chunk)
+        if last:
+            data += self._compressor.flush()
+        else:
+            data += self._compressor.flush(self._flush_mode)
+        compressed_bytes.inc(len(chunk), encoding=self.encoding, stage="in")
+        compressed_bytes.inc(len(data), encoding=self.encoding, stage="out")
+        return data
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses with gzip or zstd.
+
+    The encoding follows Accept-Encoding. Single-chunk bodies under
+    ``minimum_size`` are sent as they are; streamed bodies are compressed
+    chunk by chunk. Event streams are left alone so events are not held
+    back. Strong ETags are weakened on compressed responses, as the bytes
+    differ from the identity representation.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        zstd_level: int = 3,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        start_message = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", []))
+                headers = MutableHeaders(raw=message["headers"])
+                media_type = headers.get("content-type", "").split(";")[0].strip()
+                if media_type in COMPRESSIBLE_TYPES:
+                    # Identity responses vary by Accept-Encoding as well
+                    headers.add_vary_header("Accept-Encoding")
+                if (
+                    encoding is None
+                    or message["status"] in (204, 304)
+                    or "content-encoding" in headers
+                    or media_type not in COMPRESSIBLE_TYPES
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Held until the first body chunk shows whether to compress
+                    start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding, self.gzip_level, self.zstd_level)
+                headers["Content-Encoding"] = encoding
+                del headers["Content-Length"]
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+                await send(start_message)
+                start_message = None
+
+            data = compressor.compress(body, last=not more_body)
+            if data or not more_body:
+                await send(
+                    {"type": "http.response.body", "body": data, "more_body": more_body}
+                )
+
+        await self.app(scope, receive, send_wrapper)
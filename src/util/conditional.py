@@ -0,0 +1,74 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import hashlib
+from typing import Iterable, Optional
+
+from fastapi import Request, Response, status
+
+from .response import response_format
+
+
+def make_etag(versions: Iterable, variant: str = "") -> str:
+    """Strong ETag over (uid, updated_at) pairs, one per resource in the body.
+
+    ``variant`` distinguishes representations of the same resources, such as
+    sparse fieldsets. The negotiated response format is one too.
+    """
+    if response_format.get() != "json":
+        variant = f"{variant};{response_format.get()}"
+    digest = hashlib.sha1(variant.encode())
+    for uid, updated_at in versions:
+        digest.update(f"{uid}:{updated_at.isoformat() if updated_at else ''};".encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def last_modified_of(versions: Iterable) -> Optional[datetime]:
+    return max((updated_at for _, updated_at in versions if updated_at), default=None)
+
+
+def _http_datetime(value: datetime) -> datetime:
+    # Timestamps are stored without a zone; HTTP dates have second precision
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def has_conditional_headers(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def is_not_modified(
+    request: Request, etag: str, last_modified: Optional[datetime]
+) -> bool:
+    """Evaluate If-None-Match, falling back to If-Modified-Since (RFC 9110)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return _http_datetime(last_modified) <= since
+    return False
+
+
+def set_validators(
+    response: Response, etag: str, last_modified: Optional[datetime]
+) -> None:
+    response.headers["ETag"] = etag
+    if last_modified:
+        response.headers["Last-Modified"] = format_datetime(
+            _http_datetime(last_modified), usegmt=True
+        )
+
+
+def not_modified(etag: str, last_modified: Optional[datetime]) -> Response:
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_validators(response, etag, last_modified)
+    return response
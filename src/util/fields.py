@@ -0,0 +1,21 @@
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str]) -> Tuple[str, ...]:
+    """Validate a comma-separated ``?fields=`` value against ``allowed``.
+
+    Returns the requested fields in declaration order, or every allowed field
+    when none were requested. Raises ValueError naming any unknown field.
+    """
+    requested = {field.strip() for field in (fields or "").split(",")} - {""}
+    if not requested:
+        return tuple(allowed)
+    unknown = requested.difference(allowed)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(field for field in allowed if field in requested)
+
+
+def project(rows: Iterable[dict], fields: Sequence[str]) -> List[dict]:
+    """Trim each row to ``fields``"""
+    return [{field: row[field] for field in fields} for row in rows]
@@ -0,0 +1,21 @@
+import logging
+import sys
+
+from uvicorn.logging import DefaultFormatter
+
+
+def configure_logging(level: str = "INFO", name: str = "src") -> None:
+    """Print the app's logs the way uvicorn prints its own.
+
+    Uvicorn only configures its own loggers, so without a handler records
+    below WARNING from ``name`` and its children are dropped. Nothing is
+    added when the root logger or ``name`` already has handlers, so an
+    explicit logging setup still wins.
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(level.upper())
+    if logger.handlers or logging.getLogger().handlers:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(DefaultFormatter("%(levelprefix)s %(message)s"))
+    logger.addHandler(handler)
@@ -0,0 +1,94 @@
+import base64
+from datetime import datetime
+import json
+from typing import Any, Callable, Mapping, Optional, Sequence, Tuple
+import uuid
+
+from fastapi import Request, Response
+
+
+def encode_cursor(**values) -> str:
+    """Encode keyset values into an opaque, URL-safe cursor"""
+    raw = json.dumps(values, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """Decode a cursor produced by encode_cursor, raising ValueError if invalid"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, dict):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def encode_created_at_cursor(row) -> str:
+    """Cursor for listings ordered by (created_at, uid) descending.
+
+    ``row`` may be an ORM object, a result row or a plain dict.
+    """
+    if isinstance(row, Mapping):
+        created_at, uid = row["created_at"], row["uid"]
+    else:
+        created_at, uid = row.created_at, row.uid
+    return encode_cursor(created_at=created_at.isoformat(), uid=str(uid))
+
+
+def decode_created_at_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    values = decode_cursor(cursor)
+    try:
+        return datetime.fromisoformat(values["created_at"]), uuid.UUID(values["uid"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def encode_keyset_cursor(row: Mapping, names: Sequence[str]) -> str:
+    """Cursor holding ``row``'s values for the sort columns ``names``.
+
+    For (created_at, uid) this is the same cursor as encode_created_at_cursor.
+    """
+    values = {}
+    for name in names:
+        value = row[name]
+        values[name] = value.isoformat() if isinstance(value, datetime) else value
+    return encode_cursor(**values)
+
+
+def decode_keyset_cursor(
+    cursor: str, parsers: Sequence[Tuple[str, Callable[[Any], Any]]]
+) -> tuple:
+    """Values of an encode_keyset_cursor cursor, each read by its parser"""
+    values = decode_cursor(cursor)
+    try:
+        return tuple(parse(values[name]) for name, parse in parsers)
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def encode_rank_cursor(rank: float, uid) -> str:
+    """Cursor for search results ordered by (rank, uid) descending"""
+    return encode_cursor(rank=rank, uid=str(uid))
+
+
+def decode_rank_cursor(cursor: str) -> tuple[float, uuid.UUID]:
+    values = decode_cursor(cursor)
+    try:
+        return float(values["rank"]), uuid.UUID(values["uid"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def set_next_cursor(
+    request: Request, response: Response, next_cursor: Optional[str]
+) -> None:
+    """Expose the next page cursor through the X-Next-Cursor and Link headers"""
+    if not next_cursor:
+        return
+    next_url = request.url.remove_query_params("skip").include_query_params(
+        cursor=next_cursor
+    )
+    response.headers["X-Next-Cursor"] = next_cursor
+    response.headers["Link"] = f'<{next_url}>; rel="next"'
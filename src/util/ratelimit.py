@@ -0,0 +1,79 @@
+import time
+from typing import Dict, List
+
+
+class RateLimitedError(Exception):
+    """Raised when a request is throttled; retry_after is in seconds"""
+
+    def __init__(self, retry_after: float, detail: str = "Too many requests"):
+        super().__init__(detail)
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets refilled at ``rate`` tokens per second.
+
+    Buckets are kept in least-recently-used order. A bucket idle long enough
+    to refill completely is indistinguishable from a new one, so it is
+    dropped from the front of the store; beyond ``max_keys`` the oldest
+    buckets are dropped too, which keeps memory bounded at any cardinality.
+    A ``rate`` of 0 disables the limiter.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 100000):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_keys = max_keys
+        self._refill_seconds = self.burst / rate if rate else 0
+        # key -> [tokens, last update]; insertion order is recency order
+        self._buckets: Dict[str, List[float]] = {}
+
+    def acquire(self, key: str, cost: float = 1) -> float:
+        """Take ``cost`` tokens; 0 if allowed, else seconds until it would be"""
+        if not self.rate:
+            return 0
+        now = time.monotonic()
+        self._purge(now)
+        bucket = self._buckets.pop(key, None)
+        if bucket is None:
+            bucket = [self.burst, now]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        self._buckets[key] = bucket
+
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            return 0
+        return (cost - bucket[0]) / self.rate
+
+    def _purge(self, now: float) -> None:
+        while self._buckets:
+            key, (_, updated_at) = next(iter(self._buckets.items()))
+            if (
+                len(self._buckets) < self.max_keys
+                and now - updated_at < self._refill_seconds
+            ):
+                break
+            del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class ConcurrencyLimiter:
+    """Caps calls in progress at once; excess calls are rejected, not queued"""
+
+    def __init__(self, limit: int, retry_after: float = 1):
+        self.limit = limit
+        self.retry_after = retry_after
+        self.in_flight = 0
+
+    def acquire(self) -> None:
+        if self.limit and self.in_flight >= self.limit:
+            raise RateLimitedError(self.retry_after, "Server is busy, please retry")
+        self.in_flight += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
@@ -1,6 +1,135 @@
+from contextvars import ContextVar
+from datetime import date, datetime
+from decimal import Decimal
+import json
+from typing import Any, Mapping, Optional
+import uuid
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.background import BackgroundTask
+from starlette.datastructures import Headers
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = (
+    MSGPACK_MEDIA_TYPE,
+    "application/x-msgpack",
+    "application/vnd.msgpack",
+)
+JSON_MEDIA_RANGES = ("application/json", "application/*", "*/*")
+
+# "json" or "msgpack", negotiated per request by NegotiationMiddleware
+response_format: ContextVar[str] = ContextVar("response_format", default="json")
+
+
 class BaseResponse:
     def __init__(self, code: int, message: str, data: dict = None):
         self.code = code
         self.message = message
         self.data = data
-    
\ No newline at end of file
+
+
+def _default(value: Any):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (uuid.UUID, Decimal)):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode content as compact JSON, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(
+        content, default=_default, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def packb(content: Any) -> bytes:
+    """Encode content as MessagePack, with the same value mapping as dumps"""
+    return msgpack.packb(content, default=_default)
+
+
+def _quality(media_range: str) -> float:
+    for param in media_range.split(";")[1:]:
+        name, _, value = param.strip().partition("=")
+        if name == "q":
+            try:
+                return float(value)
+            except ValueError:
+                return 0
+    return 1
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """ "msgpack" when Accept prefers it over JSON and msgpack is installed"""
+    if not accept or msgpack is None:
+        return "json"
+    qualities = {}
+    for media_range in accept.split(","):
+        media_type = media_range.split(";")[0].strip().lower()
+        qualities[media_type] = max(qualities.get(media_type, 0), _quality(media_range))
+    packed = max(qualities.get(media_type, 0) for media_type in MSGPACK_MEDIA_TYPES)
+    plain = max(qualities.get(media_type, 0) for media_type in JSON_MEDIA_RANGES)
+    return "msgpack" if packed and packed >= plain else "json"
+
+
+class NegotiationMiddleware:
+    """ASGI middleware choosing the response format from the Accept header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = response_format.set(
+            negotiate_format(Headers(scope=scope).get("accept"))
+        )
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            response_format.reset(token)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response that encodes plain rows directly.
+
+    Handlers return it with dicts of column values so that FastAPI skips the
+    response_model validation and jsonable_encoder passes; UUIDs and
+    datetimes are encoded as-is. Clients that prefer MessagePack in Accept
+    get the same content as MessagePack.
+    """
+
+    def __init__(
+        self,
+        content: Any,
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: Optional[str] = None,
+        background: Optional[BackgroundTask] = None,
+    ):
+        self.format = response_format.get()
+        if self.format == "msgpack":
+            media_type = MSGPACK_MEDIA_TYPE
+        super().__init__(content, status_code, headers, media_type, background)
+        if msgpack is not None:
+            self.headers.add_vary_header("Accept")
+
+    def render(self, content: Any) -> bytes:
+        if self.format == "msgpack":
+            return packb(content)
+        return dumps(content)
@@ -0,0 +1,80 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, TypeVar
+
+from .metrics import registry
+
+T = TypeVar("T")
+
+single_flight_calls = registry.counter(
+    "single_flight_calls_total",
+    "Coalesced reads by method and outcome: executed or coalesced",
+)
+
+
+class SingleFlight:
+    """Lets concurrent callers with the same key share one in-flight call.
+
+    The first caller for a key runs the call; callers that arrive while it
+    is running wait for and receive the same result or exception. Nothing is
+    cached once the call finishes. Shared results must not be mutated.
+    """
+
+    def __init__(self, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        if not self.enabled:
+            return await fn()
+
+        while key in self._calls:
+            future = self._calls[key]
+            self.coalesced += 1
+            single_flight_calls.inc(method=self.name, outcome="coalesced")
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The leader was cancelled, not this caller: try again
+                if not future.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.executed += 1
+        single_flight_calls.inc(method=self.name, outcome="executed")
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark it retrieved so an unwaited future does not log a warning
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._calls),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+        }
+
+
+_flights: Dict[str, SingleFlight] = {}
+
+
+def single_flight(name: str, enabled_methods: Iterable[str]) -> SingleFlight:
+    """Shared SingleFlight for ``name``, enabled when listed in enabled_methods"""
+    if name not in _flights:
+        _flights[name] = SingleFlight(name, enabled=name in set(enabled_methods))
+    return _flights[name]
@@ -0,0 +1,38 @@
+from contextlib import contextmanager
+import logging
+import time
+from typing import Dict
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+startup_phase_seconds = registry.gauge(
+    "startup_phase_seconds", "Time spent in each cold-start phase"
+)
+
+
+class StartupTimer:
+    """Records how long each cold-start phase took and reports it once"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+
+    def record(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = seconds
+        startup_phase_seconds.set(seconds, phase=phase)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def report(self) -> str:
+        parts = [
+            f"{phase} {seconds * 1000:.0f}ms" for phase, seconds in self.phases.items()
+        ]
+        total = sum(self.phases.values())
+        return f"startup took {total * 1000:.0f}ms: " + ", ".join(parts)
@@ -0,0 +1,190 @@
+import codecs
+from collections import deque
+import csv
+from datetime import date
+import io
+import json
+from typing import AsyncIterable, AsyncIterator, Deque, List, Mapping, Tuple, Union
+
+Record = Union[dict, ValueError]
+
+# Rows are grouped into chunks of roughly this many bytes before being sent
+CHUNK_SIZE = 64 * 1024
+
+
+async def iter_lines(
+    chunks: AsyncIterable[bytes], max_length: int = 1024 * 1024
+) -> AsyncIterator[Union[str, ValueError]]:
+    """Split a streamed UTF-8 body into lines without buffering the whole body.
+
+    A line longer than ``max_length`` characters is skipped up to the next
+    newline and yields a ValueError in its place, so memory stays bounded.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    too_long = ValueError(f"Line exceeds {max_length} characters")
+    pending = ""
+    skipping = False
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            if skipping:
+                # The rest of an overlong line that was already reported
+                skipping = False
+            elif len(line) > max_length:
+                yield too_long
+            else:
+                yield line.rstrip("\r")
+        if len(pending) > max_length:
+            if not skipping:
+                yield too_long
+            skipping = True
+            pending = ""
+    pending += decoder.decode(b"", final=True)
+    if pending and not skipping:
+        yield too_long if len(pending) > max_length else pending.rstrip("\r")
+
+
+async def iter_ndjson(
+    lines: AsyncIterable[Union[str, ValueError]],
+) -> AsyncIterator[Tuple[int, Record]]:
+    """Yield (line number, record) pairs; malformed lines yield a ValueError"""
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if isinstance(line, ValueError):
+            yield line_number, line
+            continue
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f"Invalid JSON: {e}")
+
+
+class _LineFeed:
+    """Iterator the CSV reader pulls lines from; refilled between records"""
+
+    def __init__(self):
+        self.lines: Deque[str] = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+def _ends_quoted(line: str, quoted: bool) -> bool:
+    """Whether a quoted field is still open after ``line``, as csv reads it.
+
+    Quotes only open a field at its start, so a stray quote inside an
+    unquoted field is literal; a doubled quote inside a field is escaped.
+    """
+    field_start = not quoted
+    closed = False
+    for char in line:
+        if quoted:
+            if char == '"':
+                quoted, closed = False, True
+            continue
+        if char == '"' and (field_start or closed):
+            quoted = True
+        closed = False
+        field_start = char == ","
+    return quoted
+
+
+async def iter_csv(
+    lines: AsyncIterable[Union[str, ValueError]], max_length: int = 1024 * 1024
+) -> AsyncIterator[Tuple[int, Record]]:
+    """Yield (line number, record) pairs keyed by the header row.
+
+    Quoted fields may span lines; such a record is numbered by its first
+    line. One reader parses the body, and lines are handed to it only once
+    they complete a record, so it never sees a record cut short.
+    """
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    header = None
+    line_number = 0
+    start = 0
+    quoted = False
+    length = 0
+    async for line in lines:
+        line_number += 1
+        if isinstance(line, ValueError):
+            if feed.lines:
+                # The records after an unclosed field cannot be found reliably
+                yield start, ValueError(
+                    "Quoted field is not closed before an overlong line"
+                )
+                return
+            yield line_number, line
+            continue
+        if not feed.lines:
+            if not line.strip():
+                continue
+            start = line_number
+        feed.lines.append(line + "\n")
+        quoted = _ends_quoted(line, quoted)
+        length += len(line)
+        if quoted:
+            if length > max_length:
+                yield start, ValueError(f"Record exceeds {max_length} characters")
+                return
+            continue
+        length = 0
+        values = next(reader)
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield start, ValueError(
+                f"Expected {len(header)} columns, got {len(values)}"
+            )
+            continue
+        yield start, dict(zip(header, values))
+    if feed.lines:
+        yield start, ValueError("Quoted field is not closed at the end of the body")
+
+
+def _json_default(value):
+    # Match the ISO 8601 timestamps the JSON API returns
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+async def encode_ndjson(rows: AsyncIterable[Mapping]) -> AsyncIterator[str]:
+    """Serialize rows as NDJSON, yielding bounded chunks as they are produced"""
+    buffer = io.StringIO()
+    async for row in rows:
+        buffer.write(json.dumps(dict(row), default=_json_default))
+        buffer.write("\n")
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+async def encode_csv(
+    rows: AsyncIterable[Mapping], fieldnames: List[str]
+) -> AsyncIterator[str]:
+    """Serialize rows as CSV with a header row, yielding bounded chunks"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction="ignore")
+    writer.writeheader()
+    async for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,9 @@
+import os
+
+# Settings without defaults; nothing here connects to the database
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("REFRESH_SECRET_KEY", "test-refresh-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "15")
+os.environ.setdefault("REFRESH_TOKEN_EXPIRE_DAYS", "7")
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from src.config import Config
+from src.util.admission import (
+    AdmissionController,
+    AdmissionMiddleware,
+    _apply_deadline,
+    build_classes,
+)
+
+BATCH_SECONDS = 0.05
+
+
+def postgres_connection(statements):
+    return SimpleNamespace(
+        dialect=SimpleNamespace(name="postgresql"),
+        exec_driver_sql=statements.append,
+    )
+
+
+async def slow_import(scope, receive, send):
+    """Stands in for POST /books/bulk: one transaction per batch, then a report"""
+    statements = []
+    for _ in range(4):
+        # What the statement deadline hook runs as each batch begins
+        _apply_deadline(None, None, postgres_connection(statements))
+        await asyncio.sleep(BATCH_SECONDS)
+    body = json.dumps({"inserted": 4, "failed": 0, "statements": statements})
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json")],
+        }
+    )
+    await send({"type": "http.response.body", "body": body.encode()})
+
+
+async def call(app, method, path):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "headers": []}
+    await app(scope, receive, send)
+    return messages[0]["status"], b"".join(m.get("body", b"") for m in messages[1:])
+
+
+def admission_app():
+    """The configured classes and routes, with every deadline cut to 1ms"""
+    classes = {
+        name: {**options, "deadline_ms": options["deadline_ms"] and 1}
+        for name, options in Config.ADMISSION_CLASSES.items()
+    }
+    controller = AdmissionController(build_classes(classes))
+    return controller, AdmissionMiddleware(
+        slow_import, controller, Config.ADMISSION_ROUTES
+    )
+
+
+def test_long_bulk_import_returns_its_report():
+    controller, app = admission_app()
+
+    started = time.monotonic()
+    status, body = asyncio.run(call(app, "POST", "/v1/books/bulk"))
+
+    assert time.monotonic() - started >= 4 * BATCH_SECONDS
+    assert status == 200
+    report = json.loads(body)
+    assert report["inserted"] == 4
+    # No statement timeout was applied to any batch
+    assert report["statements"] == []
+    assert controller.in_flight == 0
+
+
+def test_deadline_still_applies_to_other_routes():
+    _, app = admission_app()
+
+    status, _ = asyncio.run(call(app, "GET", "/v1/books"))
+
+    assert status == 503
@@ -0,0 +1,56 @@
+import asyncio
+from datetime import datetime
+import json
+import uuid
+
+from src.books.service import BookService
+from src.util.cache import KeyValueCache, LocalKeyValueClient
+from src.util.changes import ChangeEvent
+
+
+class SlowBookService(BookService):
+    """Reads a book row that can be held back until a write has happened"""
+
+    def __init__(self, cache):
+        super().__init__(cache)
+        now = datetime.now()
+        self.row = {
+            "uid": uuid.uuid4(),
+            "title": "Old title",
+            "author": "Author 1",
+            "year": 2001,
+            "description": "",
+            "created_at": now,
+            "updated_at": now,
+        }
+        self.reads = 0
+        self.release = asyncio.Event()
+
+    async def getBookRow(self, book_uid, session):
+        row = dict(self.row)
+        self.reads += 1
+        if self.reads == 1:
+            await self.release.wait()
+        return row
+
+
+def test_update_during_a_miss_orphans_the_late_set():
+    async def run():
+        service = SlowBookService(KeyValueCache(LocalKeyValueClient(), shared=False))
+        book_uid = str(service.row["uid"])
+
+        # A miss reads the old row, but the update lands before it is cached
+        reader = asyncio.create_task(service.getBookCached(book_uid, None))
+        while not service.reads:
+            await asyncio.sleep(0)
+        service.row["title"] = "New title"
+        change = ChangeEvent("1", "updated", json.dumps({"uid": book_uid}))
+        await service.forgetChange(change)
+        service.release.set()
+        assert (await reader)["title"] == "Old title"
+
+        book = await service.getBookCached(book_uid, None)
+        assert book["title"] == "New title"
+        assert service.reads == 2
+
+    asyncio.run(run())
@@ -0,0 +1,145 @@
+"""Every supported book listing shape is served by the index meant for it.
+
+Needs a Postgres server: set TEST_DATABASE_URL (postgresql+asyncpg://...) to
+run. The books table and its indexes are created from the model in a scratch
+schema, seeded and analyzed, and everything is rolled back afterwards. The
+planner picks freely, so a shape only passes when its index is the cheapest
+plan on realistic data.
+"""
+
+import asyncio
+from datetime import datetime
+import json
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+import uuid
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import select
+
+from src.books.models import Books
+from src.books.schema import BookFilters
+from src.books.service import BOOK_COLUMNS, BookService
+from src.util.pagination import encode_keyset_cursor
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(
+    not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set"
+)
+
+BOOK_COUNT = 20000
+# 1000 authors with 20 books each, 120 years and about nine years of rows
+SEED = f"""
+INSERT INTO books (uid, title, author, year, description, created_at, updated_at)
+SELECT md5(i::text)::uuid, 'Book ' || i, 'Author ' || (i % 1000),
+       1900 + i % 120, '', timestamp '2015-01-01' + i * interval '4 hours', now()
+FROM generate_series(1, {BOOK_COUNT}) AS i
+"""
+
+FILTERS = {
+    "none": BookFilters(),
+    "author": BookFilters(author="Author 1"),
+    "author_prefix": BookFilters(author_prefix="Author 12"),
+    "year": BookFilters(year_min=1995, year_max=1995),
+    "created_range": BookFilters(
+        created_after=datetime(2020, 1, 1), created_before=datetime(2021, 1, 1)
+    ),
+    "author_year": BookFilters(author="Author 1", year_min=1990),
+}
+CURSOR_ROW = {
+    "created_at": datetime(2020, 6, 1),
+    "uid": uuid.UUID(int=0),
+    "year": 1995,
+    "author": "Author 1",
+}
+CREATED_AT = "ix_books_created_at_uid"
+AUTHOR = "ix_books_author_created_at_uid"
+YEAR = "ix_books_year_created_at_uid"
+# LIKE 'prefix%' seeks the pattern index, or the plain one under the C collation
+AUTHOR_PREFIX = (AUTHOR, "ix_books_author_pattern")
+
+# (filter, sort, indexes any of which may serve the shape)
+SHAPES: List[Tuple[str, str, Tuple[str, ...]]] = [
+    ("none", "-created_at", (CREATED_AT,)),
+    ("none", "created_at", (CREATED_AT,)),
+    ("none", "-year", (YEAR,)),
+    ("none", "year", (YEAR,)),
+    ("none", "-author", (AUTHOR,)),
+    ("none", "author", (AUTHOR,)),
+    ("author", "-created_at", (AUTHOR,)),
+    ("author", "author", (AUTHOR,)),
+    ("author_prefix", "author", AUTHOR_PREFIX),
+    ("author_prefix", "-created_at", AUTHOR_PREFIX),
+    ("year", "-created_at", (YEAR,)),
+    ("year", "year", (YEAR,)),
+    ("created_range", "-created_at", (CREATED_AT,)),
+    ("created_range", "created_at", (CREATED_AT,)),
+    ("author_year", "-created_at", (AUTHOR,)),
+]
+
+
+def plan_nodes(plan: dict) -> Iterator[dict]:
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def statement_for(name: str, sort: str, paged: bool):
+    service = BookService()
+    cursor: Optional[str] = None
+    if paged:
+        cursor = encode_keyset_cursor(CURSOR_ROW, service.sortColumns(sort))
+    return service._pageStatement(
+        select(*BOOK_COLUMNS), 0, 100, cursor, FILTERS[name], sort
+    )
+
+
+async def explain_shapes() -> Dict[Tuple[str, str, bool], List[dict]]:
+    engine = create_async_engine(TEST_DATABASE_URL, poolclass=NullPool)
+    plans = {}
+    try:
+        async with engine.connect() as conn:
+            transaction = await conn.begin()
+            await conn.execute(text("CREATE SCHEMA explain_check"))
+            await conn.execute(text("SET LOCAL search_path TO explain_check"))
+            await conn.run_sync(Books.__table__.create)
+            await conn.execute(text(SEED))
+            await conn.execute(text("ANALYZE books"))
+            for name, sort, _ in SHAPES:
+                for paged in (False, True):
+                    sql = statement_for(name, sort, paged).compile(
+                        dialect=conn.dialect, compile_kwargs={"literal_binds": True}
+                    )
+                    result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}")
+                    plan = result.scalar()
+                    plan = json.loads(plan) if isinstance(plan, str) else plan
+                    plans[name, sort, paged] = list(plan_nodes(plan[0]["Plan"]))
+            await transaction.rollback()
+    finally:
+        await engine.dispose()
+    return plans
+
+
+@pytest.fixture(scope="module")
+def plans():
+    return asyncio.run(explain_shapes())
+
+
+@pytest.mark.parametrize("paged", [False, True], ids=["first_page", "cursor"])
+@pytest.mark.parametrize(
+    "name, sort, indexes", SHAPES, ids=[f"{name}:{sort}" for name, sort, _ in SHAPES]
+)
+def test_listing_uses_its_index(plans, name, sort, indexes, paged):
+    nodes = plans[name, sort, paged]
+    used = {node["Index Name"] for node in nodes if "Index Name" in node}
+    assert not any(
+        node["Node Type"] == "Seq Scan" and node.get("Relation Name") == "books"
+        for node in nodes
+    )
+    assert used & set(indexes), f"expected one of {indexes}, plan used {used}"
+    if name == "none":
+        # Unfiltered pages must be read in index order, not sorted
+        assert not any(node["Node Type"] == "Sort" for node in nodes)
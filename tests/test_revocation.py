@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime, timezone
+import time
+import uuid
+
+from fastapi import HTTPException
+import pytest
+
+from src.auth.revocation import revocation_feed
+from src.auth.util import auth_util
+from src.users.models import Users
+from src.util.changes import FeedListener
+
+
+class UnreachableEngine:
+    """An engine whose LISTEN connection always fails"""
+
+    def __init__(self):
+        self.attempts = 0
+
+    def connect(self):
+        self.attempts += 1
+        raise OSError("connection refused")
+
+
+def test_dropped_listener_sends_earlier_tokens_to_the_database(monkeypatch):
+    user = Users(
+        uid=uuid.uuid4(),
+        username="alice",
+        email="alice@example.com",
+        password_hash="",
+        created_at=datetime.now(),
+        updated_at=datetime.now(),
+    )
+
+    async def get_user(username, session):
+        return user
+
+    monkeypatch.setattr(auth_util, "get_user", get_user)
+    monkeypatch.setattr(revocation_feed, "notify", True)
+    token = auth_util.generate_token(user).access_token
+
+    async def run():
+        profile = await auth_util.verify_access_claims(token, None)
+        assert profile.username == "alice"
+
+        # Another worker revokes the token, but its notification is lost
+        user.tokens_revoked_at = datetime.fromtimestamp(time.time(), timezone.utc)
+        await auth_util.verify_access_claims(token, None)
+
+        listener = FeedListener([revocation_feed])
+        engine = UnreachableEngine()
+        await listener.start(engine)
+        while not engine.attempts:
+            await asyncio.sleep(0)
+        await listener.stop()
+
+        with pytest.raises(HTTPException) as e:
+            await auth_util.verify_access_claims(token, None)
+        assert e.value.status_code == 401
+
+    asyncio.run(run())
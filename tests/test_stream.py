@@ -0,0 +1,66 @@
+import asyncio
+from typing import List
+
+from src.util.stream import iter_csv, iter_lines, iter_ndjson
+
+
+async def body(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+def collect(records) -> List:
+    async def run():
+        return [record async for record in records]
+
+    return asyncio.run(run())
+
+
+def parse_csv(*chunks: bytes, max_length: int = 1024 * 1024) -> List:
+    return collect(iter_csv(iter_lines(body(*chunks), max_length), max_length))
+
+
+def test_quoted_field_spans_lines():
+    records = parse_csv(
+        b'title,author\n"Line one\nline two",Author 1\nPlain,Author 2\n'
+    )
+    assert records == [
+        (2, {"title": "Line one\nline two", "author": "Author 1"}),
+        (4, {"title": "Plain", "author": "Author 2"}),
+    ]
+
+
+def test_overlong_line_is_reported_and_skipped():
+    records = parse_csv(
+        b"title,author\n",
+        b"x" * 40,
+        b"x" * 40 + b",Author 1\n",
+        b"Short,A\n",
+        max_length=50,
+    )
+    assert len(records) == 2
+    line, error = records[0]
+    assert line == 2 and isinstance(error, ValueError)
+    assert str(error) == "Line exceeds 50 characters"
+    assert records[1] == (3, {"title": "Short", "author": "A"})
+
+
+def test_crlf_split_across_chunks():
+    lines = collect(iter_lines(body(b"first\r", b"\nsecond\r\n")))
+    assert lines == ["first", "second"]
+
+    records = collect(iter_ndjson(iter_lines(body(b'{"a": 1}\r', b'\n{"a": 2}\r\n'))))
+    assert records == [(1, {"a": 1}), (2, {"a": 2})]
+
+
+def test_malformed_rows_fail_alone():
+    records = parse_csv(b"title,author\nOnly one column\nGood,Author 1\n")
+    line, error = records[0]
+    assert line == 2 and str(error) == "Expected 2 columns, got 1"
+    assert records[1] == (3, {"title": "Good", "author": "Author 1"})
+
+    records = collect(iter_ndjson(iter_lines(body(b'{"a": 1}\n{broken\n{"a": 2}\n'))))
+    assert records[0] == (1, {"a": 1})
+    line, error = records[1]
+    assert line == 2 and str(error).startswith("Invalid JSON")
+    assert records[2] == (3, {"a": 2})